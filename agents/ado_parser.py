@@ -2,11 +2,13 @@
 ADO PARSER - DYNAMIC AI-POWERED VERSION
 Uses Gemini AI to intelligently parse user stories into requirements.
 """
-from agents.base_agent import BaseAgent
+from agents.base_agent import BaseAgent, _FENCE_RE, _loads
 from typing import Dict, Any
 import json
 import asyncio
 
+_REQUIRED_KEYS = frozenset({"frontend_requirements", "backend_requirements", "database_requirements"})
+
 class ADOParserAgent(BaseAgent):
     def __init__(self):
         super().__init__("ado_parser")
@@ -16,7 +18,7 @@ class ADOParserAgent(BaseAgent):
         task_id = task.get("task_id", "unknown")
         user_story = task.get("user_story", "") or ""
         
-        await self._publish_status(task_id, self.agent_id, "parsing", {"story_length": len(user_story)})
+        self._publish_status(task_id, self.agent_id, "parsing", {"story_length": len(user_story)})
         
         # ✅ USE AI TO INTELLIGENTLY PARSE REQUIREMENTS
         prompt = f"""Analyze this user story and break it into technical requirements:
@@ -42,18 +44,18 @@ Return ONLY the JSON object, no markdown, no explanation."""
             response = await self.generate_response(prompt)
             
             # Clean the response
-            cleaned = response.replace("```json", "").replace("```", "").strip()
+            cleaned = _FENCE_RE.sub("", response).strip()
             
             # Parse JSON
-            result_json = json.loads(cleaned)
+            result_json = _loads(cleaned)
             
             # Validate required keys exist
-            required_keys = ["frontend_requirements", "backend_requirements", "database_requirements"]
-            for key in required_keys:
-                if key not in result_json:
-                    result_json[key] = f"Create implementation for: {user_story}"
+            missing = _REQUIRED_KEYS.difference(result_json)
+            if missing:
+                fallback = f"Create implementation for: {user_story}"
+                result_json.update({key: fallback for key in missing})
             
-            await self._publish_status(task_id, self.agent_id, "completed", {})
+            self._publish_status(task_id, self.agent_id, "completed", {})
             return {"status": "success", "result": result_json}
             
         except json.JSONDecodeError as e:
@@ -64,13 +66,13 @@ Return ONLY the JSON object, no markdown, no explanation."""
                 "backend_requirements": f"Create a REST API backend for: {user_story}",
                 "database_requirements": f"Create a database schema for: {user_story}"
             }
-            await self._publish_status(task_id, self.agent_id, "completed", {})
+            self._publish_status(task_id, self.agent_id, "completed", {})
             return {"status": "success", "result": result_json}
             
         except Exception as e:
             print(f"❌ Parser error: {e}")
-            await self._publish_status(task_id, self.agent_id, "failed", {"error": str(e)})
+            self._publish_status(task_id, self.agent_id, "failed", {"error": str(e)})
             return {"status": "failed", "error": str(e)}
 
-    async def process_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
-        return await self.execute_task(task)
\ No newline at end of file
+    # Alias rather than a wrapper coroutine (no extra frame per call)
+    process_task = execute_task
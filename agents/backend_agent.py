@@ -1,6 +1,5 @@
-from agents.base_agent import BaseAgent
+from agents.base_agent import BaseAgent, _FENCE_RE, _loads
 from typing import Dict, Any
-import json
 
 class BackendAgent(BaseAgent):
     def __init__(self):
@@ -9,7 +8,7 @@ class BackendAgent(BaseAgent):
     async def execute_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
         task_id = task.get("task_id", "unknown")
         requirements = task.get("requirements", "")
-        await self._publish_status(task_id, self.agent_id, "starting", {})
+        self._publish_status(task_id, self.agent_id, "starting", {})
 
         prompt = f'''
         You are an expert FastAPI developer.
@@ -19,7 +18,9 @@ class BackendAgent(BaseAgent):
 
         try:
             response = await self.generate_response(prompt)
-            cleaned = response.replace("```json", "").replace("```", "").strip()
-            return {"status": "success", "result": json.loads(cleaned)}
+            if isinstance(response, dict):
+                return {"status": "success", "result": response}
+            cleaned = _FENCE_RE.sub("", response).strip()
+            return {"status": "success", "result": _loads(cleaned)}
         except Exception as e:
             return {"status": "failed", "error": str(e)}
@@ -3,12 +3,22 @@ BASE AGENT WITH RATE LIMITING & RETRY LOGIC
 Handles API quota limits gracefully
 """
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union
 import asyncio
+import atexit
 import json
+import logging
 import os
+import random
 import re
 import time
+from collections import OrderedDict
+from hashlib import sha256
+from logging.handlers import QueueHandler, QueueListener
+from queue import Queue
+
+from core.rate_limiter import AsyncTokenBucket, PerLoop
+from core.redis_manager import get_redis_bus
 
 # Safe Import
 try:
@@ -18,176 +28,87 @@ except ImportError:
     genai = None
     HAS_GOOGLE_LIB = False
 
-class BaseAgent(ABC):
-    def __init__(self, agent_id: str):
-        self.agent_id = agent_id
-        self.current_status = "idle"
-        self.model = None
-        
-        # Rate limiting
-        self.last_request_time = 0
-        self.min_request_interval = 4.0  # 4 seconds between requests (15 RPM = ~4s)
-        
-        # Demo mode fallback
-        self.demo_mode = os.getenv("DEMO_MODE", "false").lower() == "true"
-
-        import os
-        MY_KEY = os.getenv("GEMINI_API_KEY", "") 
-
-        if MY_KEY and "PASTE" not in MY_KEY:
-            clean_key = MY_KEY.strip().replace('\n', '').replace('\r', '')
-            if HAS_GOOGLE_LIB:
-                try:
-                    genai.configure(api_key=clean_key)
-                    self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
-                    print(f"✅ {agent_id}: AI Connected & Ready.")
-                except Exception as e:
-                    print(f"❌ {agent_id}: AI Init Failed: {e}")
-
-    @abstractmethod
-    async def execute_task(self, task: Dict[str, Any]) -> Dict[str, Any]: pass
-
-    def get_metrics(self) -> Dict[str, Any]:
-        return {"id": self.agent_id, "status": self.current_status}
-
-    async def _publish_status(self, task_id, agent_id, status, data=None): pass
-
-    async def _rate_limit(self):
-        """Enforce minimum time between requests"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        
-        if time_since_last < self.min_request_interval:
-            wait_time = self.min_request_interval - time_since_last
-            print(f"⏱️  {self.agent_id}: Rate limiting, waiting {wait_time:.1f}s")
-            await asyncio.sleep(wait_time)
-
-    def _extract_retry_delay(self, error_msg: str) -> float:
-        """Extract retry delay from error message"""
-        match = re.search(r'retry in ([\d.]+)s', error_msg)
-        if match:
-            return float(match.group(1))
-        return 30.0  # Default 30 seconds
-
-    async def generate_response(self, prompt: str) -> str:
-        """Generate with rate limiting and retry logic"""
-        self.current_status = "processing"
-        
-        if not self.model:
-            return self._error_response("API Key Missing or Invalid")
-
-        # Apply rate limiting BEFORE making request
-        await self._rate_limit()
+# Faster JSON when orjson is available
+try:
+    import orjson
+    _loads = orjson.loads
 
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                # Build system instruction based on agent type
-                if "frontend" in self.agent_id:
-                    system_instruction = f"""
-You are an expert React developer. 
-{prompt}
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    _loads = json.loads
+    _dumps = json.dumps
+
+# Agent logs go through a queue so stdout writes never block the event loop
+logger = logging.getLogger("devorchestra.agent")
+if not logger.handlers:
+    _log_queue = Queue(-1)
+    _log_listener = QueueListener(_log_queue, logging.StreamHandler())
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+    logger.addHandler(QueueHandler(_log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Markdown code fences (with optional language tag), stripped in a single pass
+_FENCE_RE = re.compile(r"```(?:json|python|sql|javascript|jsx)?")
+
+# Endpoint / table extraction patterns for generated code
+_ENDPOINT_RES = [
+    re.compile(r'@app\.(get|post|put|delete|patch)\(["\']([^"\']+)["\']'),
+    re.compile(r'@router\.(get|post|put|delete|patch)\(["\']([^"\']+)["\']'),
+]
+_RETRY_RE = re.compile(r'retry[_ ]?(?:in|delay)[^\d]*([\d.]+)')
+_TABLE_RE = re.compile(r'CREATE TABLE (?:IF NOT EXISTS )?([a-zA-Z_][a-zA-Z0-9_]*)', re.IGNORECASE)
+
+# Static per-role system instructions. Never interpolate user data into these:
+# a byte-identical prefix is what lets Gemini reuse its cached prompt tokens.
+_ROLE_PROMPTS = {
+    "frontend": """
+You are an expert React developer.
 
 Return ONLY a single valid React Functional Component.
 - Use Tailwind CSS for styling
 - Use 'lucide-react' for icons
 - DO NOT use markdown backticks
 - Must be 'export default function App()'
-"""
-                elif "backend" in self.agent_id:
-                    system_instruction = f"""
+""",
+    "backend": """
 You are an expert FastAPI developer.
-{prompt}
 
 Return valid Python FastAPI code with proper endpoints.
 DO NOT use markdown backticks.
-"""
-                elif "database" in self.agent_id:
-                    system_instruction = f"""
+""",
+    "database": """
 You are a database architect.
-{prompt}
 
 Return valid PostgreSQL CREATE TABLE statements.
 DO NOT use markdown backticks.
-"""
-                elif "ado_parser" in self.agent_id or "parser" in self.agent_id:
-                    system_instruction = f"""
-{prompt}
-
+""",
+    "parser": """
 Return ONLY valid JSON. No markdown, no explanations.
-"""
-                else:
-                    system_instruction = prompt
-                
-                # Call AI
-                response = await self.model.generate_content_async(system_instruction)
-                raw_text = response.text
-                
-                # Success! Update last request time
-                self.last_request_time = time.time()
-                
-                # Clean output
-                clean_code = raw_text.replace("```javascript", "").replace("```jsx", "") \
-                                      .replace("```python", "").replace("```sql", "") \
-                                      .replace("```json", "").replace("```", "").strip()
-                
-                self.current_status = "idle"
-                
-                # Package response
-                if "frontend" in self.agent_id:
-                    response_obj = {
-                        "component_code": clean_code,
-                        "dependencies": ["react", "lucide-react", "tailwindcss"]
-                    }
-                    return f"```json\n{json.dumps(response_obj)}\n```"
-                    
-                elif "backend" in self.agent_id:
-                    response_obj = {
-                        "api_code": clean_code,
-                        "endpoints": self._extract_endpoints(clean_code)
-                    }
-                    return f"```json\n{json.dumps(response_obj)}\n```"
-                    
-                elif "database" in self.agent_id:
-                    response_obj = {
-                        "schema_sql": clean_code,
-                        "tables": self._extract_table_names(clean_code)
-                    }
-                    return f"```json\n{json.dumps(response_obj)}\n```"
-                    
-                else:
-                    return clean_code
-
-            except Exception as e:
-                error_msg = str(e)
-                
-                # Check if it's a rate limit error
-                if "429" in error_msg or "quota" in error_msg.lower() or "rate" in error_msg.lower():
-                    wait_time = self._extract_retry_delay(error_msg)
-                    
-                    if attempt < max_retries - 1:
-                        print(f"⏳ {self.agent_id}: Rate limit hit (attempt {attempt+1}/{max_retries}). Waiting {wait_time:.0f}s...")
-                        await asyncio.sleep(wait_time)
-                        continue
-                    else:
-                        print(f"❌ {self.agent_id}: Max retries reached. Quota exhausted.")
-                        # Fallback to demo mode
-                        if self.demo_mode or True:  # Always fallback for now
-                            print(f"🎭 {self.agent_id}: Using demo fallback")
-                            return self._get_demo_response(prompt)
-                        else:
-                            return self._error_response(f"API quota exceeded. Please try again in {wait_time:.0f}s or upgrade your plan.")
-                else:
-                    print(f"❌ {self.agent_id}: Generation error: {error_msg}")
-                    return self._error_response(f"Generation failed: {error_msg}")
-
-        # Should never reach here, but just in case
-        return self._error_response("Max retries exceeded")
-
-    def _get_demo_response(self, prompt: str) -> str:
-        """Fallback demo responses when quota is exceeded"""
-        if "frontend" in self.agent_id:
-            demo_code = """import React, { useState } from 'react';
+""",
+    "integration": """
+Analyze the integration between the given Frontend and Backend code.
+
+VERIFY:
+1. Do API endpoints match? (e.g., fetch('/api/login') vs @app.post('/api/login'))
+2. Do HTTP methods match? (GET vs POST)
+3. Do request bodies match expected schemas?
+4. Are response formats handled correctly?
+
+OUTPUT JSON:
+{
+    "compatible": <boolean>,
+    "compatibility_score": <0-100>,
+    "mismatches": ["list", "of", "route/data", "mismatches"],
+    "integration_plan": "Short summary of how they connect"
+}
+""",
+}
+
+# Demo-mode fallbacks, serialized once at import time
+_DEMO_FRONTEND_CODE = """import React, { useState } from 'react';
 import { Sparkles, Info } from 'lucide-react';
 
 export default function App() {
@@ -228,10 +149,9 @@ export default function App() {
         </div>
     );
 }"""
-            return f"```json\n{json.dumps({'component_code': demo_code, 'dependencies': ['react', 'lucide-react']})}\n```"
-        
-        elif "backend" in self.agent_id:
-            demo_code = """from fastapi import FastAPI, HTTPException
+_DEMO_FRONTEND = f"```json\n{_dumps({'component_code': _DEMO_FRONTEND_CODE, 'dependencies': ['react', 'lucide-react']})}\n```"
+
+_DEMO_BACKEND_CODE = """from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -263,10 +183,9 @@ async def get_items():
 @app.post("/items")
 async def create_item(item: Item):
     return {"message": "Created", "item": item}"""
-            return f"```json\n{json.dumps({'api_code': demo_code, 'endpoints': ['GET /', 'GET /items', 'POST /items']})}\n```"
-        
-        elif "database" in self.agent_id:
-            demo_sql = """-- Demo Database Schema (Fallback Mode)
+_DEMO_BACKEND = f"```json\n{_dumps({'api_code': _DEMO_BACKEND_CODE, 'endpoints': ['GET /', 'GET /items', 'POST /items']})}\n```"
+
+_DEMO_DATABASE_SQL = """-- Demo Database Schema (Fallback Mode)
 -- API quota reached. Upgrade for custom schemas.
 
 CREATE TABLE IF NOT EXISTS demo_items (
@@ -280,33 +199,313 @@ CREATE INDEX idx_demo_items_name ON demo_items(name);
 
 -- This is a placeholder schema
 -- Real implementation would match your specific requirements"""
-            return f"```json\n{json.dumps({'schema_sql': demo_sql, 'tables': ['demo_items']})}\n```"
+_DEMO_DATABASE = f"```json\n{_dumps({'schema_sql': _DEMO_DATABASE_SQL, 'tables': ['demo_items']})}\n```"
+
+# Gemini free tier: 15 requests/minute
+_GEMINI_RPM = int(os.getenv("GEMINI_RPM", "15"))
+
+# Result handed to coalesced waiters when the owning call was cancelled: they retry on their own
+_OWNER_CANCELLED = object()
+
+_DEMO_DEFAULT = _dumps({"message": "Demo fallback response", "status": "quota_exceeded"})
+_DEMO_BY_ROLE = {
+    "frontend": _DEMO_FRONTEND,
+    "backend": _DEMO_BACKEND,
+    "database": _DEMO_DATABASE,
+}
+
+class BaseAgent(ABC):
+    # One limiter per provider, shared across every agent instance (sized from Gemini's RPM)
+    _limiter = AsyncTokenBucket(rate_per_sec=_GEMINI_RPM / 60.0, burst=_GEMINI_RPM)
+
+    # Caps concurrent in-flight Gemini requests (acquired after the bucket); one semaphore per event loop
+    _inflight = PerLoop(lambda: asyncio.Semaphore(int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))))
+
+    # Shared response cache: sha256(agent_id|prompt) -> (stored_at, response)
+    _resp_cache: "OrderedDict[str, tuple]" = OrderedDict()
+    _CACHE_TTL = 3600
+    _CACHE_MAX = 512
+    # Second tier shared by every process through Redis ("llm:" + cache key)
+    _SHARED_CACHE_TTL = 86400
+
+    # Single-flight: cache_key -> Future of the in-progress generation
+    _pending: Dict[str, "asyncio.Future"] = {}
+
+    # genai is configured once; models are shared per role
+    _configured = False
+    _models: Dict[Any, Any] = {}
+
+    # Retry backoff: base * 2^attempt (capped), jittered to desync agents
+    _BACKOFF_BASE = 2.0
+    _BACKOFF_CAP = 60.0
+
+    def __init__(self, agent_id: str):
+        self.agent_id = agent_id
+        # Resolve the role once instead of substring-scanning agent_id per call
+        for role in ("frontend", "backend", "database", "parser", "integration"):
+            if role in agent_id:
+                self._role = role
+                break
+        else:
+            self._role = "generic"
+        self.current_status = "idle"
+        self.model = None
+        # Per-instance RNG for retry jitter (avoids contention on the global one)
+        self._rng = random.Random()
+        
+        # Demo mode fallback
+        self.demo_mode = os.getenv("DEMO_MODE", "false").lower() == "true"
+
+        MY_KEY = os.getenv("GEMINI_API_KEY", "") 
+
+        if MY_KEY and "PASTE" not in MY_KEY:
+            clean_key = MY_KEY.strip().replace('\n', '').replace('\r', '')
+            if HAS_GOOGLE_LIB:
+                try:
+                    # Configure once per process, share one model per role
+                    if not BaseAgent._configured:
+                        genai.configure(api_key=clean_key)
+                        BaseAgent._configured = True
+                    if self._role not in BaseAgent._models:
+                        BaseAgent._models[self._role] = genai.GenerativeModel(
+                            'gemini-2.0-flash-exp',
+                            system_instruction=_ROLE_PROMPTS.get(self._role)
+                        )
+                    self.model = BaseAgent._models[self._role]
+                    logger.info(f"✅ {agent_id}: AI Connected & Ready.")
+                except Exception as e:
+                    logger.error(f"❌ {agent_id}: AI Init Failed: {e}")
+
+    @abstractmethod
+    async def execute_task(self, task: Dict[str, Any]) -> Dict[str, Any]: pass
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {"id": self.agent_id, "status": self.current_status}
+
+    def _publish_status(self, task_id, agent_id, status, data=None):
+        """Status hook; sync no-op so call sites don't pay for an await"""
+        pass
+
+    async def _rate_limit(self):
+        """Acquire a token from the shared provider limiter"""
+        wait_time = await BaseAgent._limiter.acquire()
+        if wait_time > 0:
+            logger.info(f"⏱️  {self.agent_id}: Rate limited, waited {wait_time:.1f}s")
+
+    def _extract_retry_delay(self, error) -> float:
+        """Extract retry delay from a rate-limit exception (or its message)"""
+        # Prefer the structured retry_delay field when the exception carries one
+        delay = getattr(error, 'retry_delay', None)
+        if isinstance(delay, (int, float)):
+            return float(delay)
+        if delay is not None and getattr(delay, 'seconds', None) is not None:
+            return float(delay.seconds) + getattr(delay, 'nanos', 0) / 1e9
+        match = _RETRY_RE.search(str(error))
+        if match:
+            return float(match.group(1))
+        return 30.0  # Default 30 seconds
+
+    def _cache_key(self, prompt: str) -> str:
+        """Key for both cache tiers (in-process and Redis `llm:`)"""
+        return sha256((self.agent_id + "|" + prompt).encode()).hexdigest()
+
+    def _cache_get(self, key: str):
+        """Return a cached response if present and not expired"""
+        entry = BaseAgent._resp_cache.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.time() - stored_at > BaseAgent._CACHE_TTL:
+            del BaseAgent._resp_cache[key]
+            return None
+        BaseAgent._resp_cache.move_to_end(key)
+        return value
+
+    def _cache_put(self, key: str, value):
+        """Store a response, evicting the least recently used entries"""
+        BaseAgent._resp_cache[key] = (time.time(), value)
+        BaseAgent._resp_cache.move_to_end(key)
+        while len(BaseAgent._resp_cache) > BaseAgent._CACHE_MAX:
+            BaseAgent._resp_cache.popitem(last=False)
+
+    async def _shared_cache_get(self, key: str):
+        bus = get_redis_bus()
+        if not bus.redis:
+            return None
+        try:
+            cached = await bus.redis.get("llm:" + key)
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            return None
+        return _loads(cached) if cached is not None else None
+
+    async def _shared_cache_put(self, key: str, value):
+        bus = get_redis_bus()
+        if not bus.redis:
+            return
+        try:
+            await bus.redis.set("llm:" + key, _dumps(value), ex=BaseAgent._SHARED_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    async def generate_response(self, prompt: str, no_cache: bool = False) -> Union[str, Dict[str, Any]]:
+        """Generate with caching, rate limiting and retry logic.
+
+        Frontend/backend/database agents get their packaged result as a dict;
+        other agents (and error/demo fallbacks) get a string. no_cache forces a
+        fresh generation and leaves both cache tiers untouched.
+        """
+        self.current_status = "processing"
         
+        if not self.model:
+            return self._error_response("API Key Missing or Invalid")
+
+        if no_cache:
+            return await self._generate_with_retries(prompt, None)
+
+        cache_key = self._cache_key(prompt)
+        while True:
+            # Identical prompts skip the API entirely
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                self.current_status = "idle"
+                return cached
+
+            # Coalesce concurrent identical prompts onto a single API call
+            pending = BaseAgent._pending.get(cache_key)
+            if pending is None:
+                break
+            result = await asyncio.shield(pending)
+            if result is not _OWNER_CANCELLED:
+                self.current_status = "idle"
+                return result
+
+        future = asyncio.get_running_loop().create_future()
+        BaseAgent._pending[cache_key] = future
+        try:
+            # Another process may already have paid for this prompt
+            result = await self._shared_cache_get(cache_key)
+            if result is not None:
+                self._cache_put(cache_key, result)
+                self.current_status = "idle"
+            else:
+                result = await self._generate_with_retries(prompt, cache_key)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved: with no waiters asyncio would log it as unhandled
+            raise
+        except BaseException:
+            # Owner cancelled: don't cascade it; waiters loop back and one of them takes over
+            future.set_result(_OWNER_CANCELLED)
+            raise
         else:
-            return json.dumps({"message": "Demo fallback response", "status": "quota_exceeded"})
+            future.set_result(result)
+            return result
+        finally:
+            BaseAgent._pending.pop(cache_key, None)
+
+    async def _generate_with_retries(self, prompt: str, cache_key: Optional[str]) -> Union[str, Dict[str, Any]]:
+        """Rate-limited API call with retry/backoff and demo fallback"""
+        # Apply rate limiting BEFORE making request
+        await self._rate_limit()
+
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                # Role template lives in the model's system_instruction, so only
+                # the dynamic prompt is sent and the prefix stays byte-identical
+                async with BaseAgent._inflight.get():
+                    response = await self.model.generate_content_async(prompt)
+                raw_text = response.text
+                
+                # Clean output
+                clean_code = _FENCE_RE.sub("", raw_text).strip()
+                
+                self.current_status = "idle"
+                
+                # Package response
+                if self._role == "frontend":
+                    result = {
+                        "component_code": clean_code,
+                        "dependencies": ["react", "lucide-react", "tailwindcss"]
+                    }
+                    
+                elif self._role == "backend":
+                    result = {
+                        "api_code": clean_code,
+                        "endpoints": self._extract_endpoints(clean_code)
+                    }
+                    
+                elif self._role == "database":
+                    result = {
+                        "schema_sql": clean_code,
+                        "tables": self._extract_table_names(clean_code)
+                    }
+                    
+                else:
+                    result = clean_code
+
+                if cache_key is not None:
+                    self._cache_put(cache_key, result)
+                    await self._shared_cache_put(cache_key, result)
+                return result
+
+            except Exception as e:
+                error_msg = str(e)
+                
+                # Check if it's a rate limit error
+                if "429" in error_msg or "quota" in error_msg.lower() or "rate" in error_msg.lower():
+                    server_delay = self._extract_retry_delay(e)
+                    backoff = min(BaseAgent._BACKOFF_CAP, BaseAgent._BACKOFF_BASE * (2 ** attempt))
+                    wait_time = max(server_delay, backoff) * self._rng.uniform(0.8, 1.3)
+                    
+                    if attempt < max_retries - 1:
+                        logger.warning(f"⏳ {self.agent_id}: Rate limit hit (attempt {attempt+1}/{max_retries}). Waiting {wait_time:.0f}s...")
+                        await asyncio.sleep(wait_time)
+                        continue
+                    else:
+                        logger.error(f"❌ {self.agent_id}: Max retries reached. Quota exhausted.")
+                        # Fallback to demo mode
+                        if self.demo_mode or True:  # Always fallback for now
+                            logger.info(f"🎭 {self.agent_id}: Using demo fallback")
+                            return self._get_demo_response(prompt)
+                        else:
+                            return self._error_response(f"API quota exceeded. Please try again in {wait_time:.0f}s or upgrade your plan.")
+                else:
+                    logger.error(f"❌ {self.agent_id}: Generation error: {error_msg}")
+                    return self._error_response(f"Generation failed: {error_msg}")
+
+        # Should never reach here, but just in case
+        return self._error_response("Max retries exceeded")
+
+    def _get_demo_response(self, prompt: str) -> str:
+        """Fallback demo responses when quota is exceeded"""
+        return _DEMO_BY_ROLE.get(self._role, _DEMO_DEFAULT)
+
+    def _is_fallback(self, response) -> bool:
+        """True for demo/error payloads, which should never be cached"""
+        if isinstance(response, dict):
+            return False
+        if self._role in _DEMO_BY_ROLE:
+            return True  # packaged roles only return strings on fallback
+        return response == _DEMO_DEFAULT or response.startswith("```json")
 
     def _extract_endpoints(self, code: str) -> list:
         """Extract API endpoints from FastAPI code"""
         endpoints = []
-        patterns = [
-            r'@app\.(get|post|put|delete|patch)\(["\']([^"\']+)["\']',
-            r'@router\.(get|post|put|delete|patch)\(["\']([^"\']+)["\']'
-        ]
-        for pattern in patterns:
-            matches = re.findall(pattern, code)
-            for method, path in matches:
+        for pattern in _ENDPOINT_RES:
+            for method, path in pattern.findall(code):
                 endpoints.append(f"{method.upper()} {path}")
         return endpoints if endpoints else ["GET /", "POST /data"]
 
     def _extract_table_names(self, sql: str) -> list:
         """Extract table names from SQL"""
-        pattern = r'CREATE TABLE (?:IF NOT EXISTS )?([a-zA-Z_][a-zA-Z0-9_]*)'
-        tables = re.findall(pattern, sql, re.IGNORECASE)
+        tables = _TABLE_RE.findall(sql)
         return tables if tables else ["main_table"]
 
     def _error_response(self, msg):
         """Graceful error UI"""
-        if "frontend" in self.agent_id:
+        if self._role == "frontend":
             err_code = f"""import React from 'react';
 import {{ AlertCircle }} from 'lucide-react';
 
@@ -331,6 +530,6 @@ export default function ErrorComponent() {{
         </div>
     );
 }}"""
-            return f"```json\n{json.dumps({'component_code': err_code, 'dependencies': ['react', 'lucide-react']})}\n```"
+            return f"```json\n{_dumps({'component_code': err_code, 'dependencies': ['react', 'lucide-react']})}\n```"
         else:
-            return f"```json\n{json.dumps({'error': msg, 'code': f'# Error: {msg}'})}\n```"
\ No newline at end of file
+            return f"```json\n{_dumps({'error': msg, 'code': f'# Error: {msg}'})}\n```"
\ No newline at end of file
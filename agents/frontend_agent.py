@@ -1,6 +1,5 @@
-from agents.base_agent import BaseAgent
+from agents.base_agent import BaseAgent, _FENCE_RE, _loads
 from typing import Dict, Any
-import json
 
 class FrontendAgent(BaseAgent):
     def __init__(self):
@@ -10,7 +9,7 @@ class FrontendAgent(BaseAgent):
         task_id = task.get("task_id", "unknown")
         requirements = task.get("requirements", "")
         
-        await self._publish_status(task_id, self.agent_id, "starting", {})
+        self._publish_status(task_id, self.agent_id, "starting", {})
 
         prompt = f'''
         You are an expert React developer.
@@ -20,8 +19,10 @@ class FrontendAgent(BaseAgent):
 
         try:
             response = await self.generate_response(prompt)
+            if isinstance(response, dict):
+                return {"status": "success", "result": response}
             # Cleanup markdown formatting
-            cleaned = response.replace("```json", "").replace("```", "").strip()
-            return {"status": "success", "result": json.loads(cleaned)}
+            cleaned = _FENCE_RE.sub("", response).strip()
+            return {"status": "success", "result": _loads(cleaned)}
         except Exception as e:
             return {"status": "failed", "error": str(e)}
@@ -1,7 +1,10 @@
 """Integration Validator Agent."""
-from agents.base_agent import BaseAgent
+from agents.base_agent import BaseAgent, _FENCE_RE, _loads
 from typing import Dict, Any
-import json
+
+def _clip(s: str, n: int) -> str:
+    """Truncate to n chars, marking it only when something was cut"""
+    return s if len(s) <= n else s[:n] + "... (truncated)"
 
 class IntegrationAgent(BaseAgent):
     def __init__(self):
@@ -14,35 +17,21 @@ class IntegrationAgent(BaseAgent):
         frontend_code = task.get("frontend_code", "")
         backend_code = task.get("backend_code", "")
 
-        prompt = f"""Analyze the integration between this Frontend and Backend.
-
-FRONTEND CODE:
-{frontend_code[:2000]}... (truncated)
+        # Analysis instructions live in the "integration" system instruction;
+        # only the code payload varies per call
+        prompt = f"""FRONTEND CODE:
+{_clip(frontend_code, 2000)}
 
 BACKEND CODE:
-{backend_code[:2000]}... (truncated)
-
-VERIFY:
-1. Do API endpoints match? (e.g., fetch('/api/login') vs @app.post('/api/login'))
-2. Do HTTP methods match? (GET vs POST)
-3. Do request bodies match expected schemas?
-4. Are response formats handled correctly?
-
-OUTPUT JSON:
-{{
-    "compatible": <boolean>,
-    "compatibility_score": <0-100>,
-    "mismatches": ["list", "of", "route/data", "mismatches"],
-    "integration_plan": "Short summary of how they connect"
-}}
+{_clip(backend_code, 2000)}
 """
 
         try:
             # Use the BaseAgent's robust generate method
             response = await self.generate_response(prompt)
             # Clean up potential markdown formatting
-            text = response.replace("```json", "").replace("```", "").strip()
-            return json.loads(text)
+            text = _FENCE_RE.sub("", response).strip()
+            return _loads(text)
         except Exception as e:
             return {
                 "compatible": False,
@@ -5,11 +5,340 @@ PRODUCTION-READY LEGACY CODE AGENT
 - Backward compatibility checks
 - Minimal diff generation
 """
-from agents.base_agent import BaseAgent
+from agents.base_agent import BaseAgent, _FENCE_RE, _loads, _dumps
+from agents import semantic_cache
+from core.redis_manager import get_redis_bus
 import ast
-from typing import Dict, Any, List, Set
+import asyncio
+import logging
+import uuid
+from typing import Dict, Any, List, Optional, Set
 import re
 import difflib
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+# Optional fast line differ (falls back to difflib)
+try:
+    from diff_match_patch import diff_match_patch
+    HAS_DMP = True
+except ImportError:
+    diff_match_patch = None
+    HAS_DMP = False
+
+logger = logging.getLogger("legacy_agent")
+
+_PHASE1_TTL = 86400  # shared Phase 1 results in Redis
+_PHASE1_LOCAL_MAX = 64
+_DIFF_TTL = 3600  # sources kept for on-demand diffs
+
+_HTTP_DECS = frozenset({'route', 'get', 'post', 'put', 'delete', 'patch'})
+_FRAMEWORK_MAP = {'flask': 'Flask', 'fastapi': 'FastAPI', 'django': 'Django', 'starlette': 'FastAPI'}
+
+def _fast_line_diff(a: str, b: str) -> List[tuple]:
+    """Line-level diff via diff-match-patch: [(op, text)] with op -1/0/1"""
+    # Terminate the last line so an appended line doesn't look like a change to it
+    if not a.endswith('\n'):
+        a += '\n'
+    if not b.endswith('\n'):
+        b += '\n'
+    dmp = diff_match_patch()
+    dmp.Diff_Timeout = 1.0
+    a_chars, b_chars, lines = dmp.diff_linesToChars(a, b)
+    diffs = dmp.diff_main(a_chars, b_chars, False)
+    dmp.diff_charsToLines(diffs, lines)
+    return diffs
+
+def _decorator_name(d: ast.expr) -> str:
+    if isinstance(d, ast.Name):
+        return d.id
+    if isinstance(d, ast.Call):
+        return getattr(d.func, 'attr', '')
+    return ''
+
+# Statement-list fields; every def/class/import/assign lives in one of these,
+# so expressions never need to be walked
+_BLOCK_FIELDS = ('body', 'handlers', 'orelse', 'finalbody', 'cases')
+
+def _child_blocks(node) -> list:
+    children = []
+    for field in _BLOCK_FIELDS:
+        block = getattr(node, field, None)
+        if block:
+            children.extend(block)
+    return children
+
+class _AstCollector:
+    """Single-pass Phase 1 collector; does not descend into function bodies.
+
+    Fields are parallel lists (one entry per class/function/endpoint) rather
+    than a dict per node.
+    """
+    def __init__(self):
+        self.class_names = []
+        self.class_methods = []
+        self.class_lines = []
+        self.function_names = []
+        self.function_args = []
+        self.function_decorators = []
+        self.function_lines = []
+        self.endpoint_methods = []
+        self.endpoint_functions = []
+        self.endpoint_lines = []
+        self.imports = set()
+        self.dependencies = set()
+        self.global_variables = []
+        self.frameworks_detected = set()
+    
+    def visit_ClassDef(self, node):
+        self.class_names.append(node.name)
+        self.class_methods.append(tuple(
+            m.name for m in node.body if isinstance(m, (ast.FunctionDef, ast.AsyncFunctionDef))
+        ))
+        self.class_lines.append(node.lineno)
+        # Methods are still recorded as functions (and endpoints)
+        return node.body
+    
+    def visit_FunctionDef(self, node):
+        decorators = []
+        for d in node.decorator_list:
+            dec = _decorator_name(d)
+            decorators.append(dec)
+            
+            # Detect Flask/FastAPI endpoints
+            if dec in _HTTP_DECS:
+                self.endpoint_methods.append(dec.upper() if dec != 'route' else 'GET')
+                self.endpoint_functions.append(node.name)
+                self.endpoint_lines.append(node.lineno)
+        
+        self.function_names.append(node.name)
+        self.function_args.append(tuple(arg.arg for arg in node.args.args))
+        self.function_decorators.append(tuple(decorators))
+        self.function_lines.append(node.lineno)
+        # Function bodies aren't walked: they don't affect top-level structure
+    
+    visit_AsyncFunctionDef = visit_FunctionDef
+    
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.imports.add(alias.name)
+            self.dependencies.add(alias.name.split('.', 1)[0])
+    
+    def visit_ImportFrom(self, node):
+        if node.module:
+            self.imports.add(node.module)
+            root = node.module.split('.', 1)[0]
+            self.dependencies.add(root)
+            
+            # Framework detection
+            framework = _FRAMEWORK_MAP.get(root.lower())
+            if framework:
+                self.frameworks_detected.add(framework)
+    
+    def visit_Assign(self, node):
+        # Global variables
+        if isinstance(node.value, ast.Constant):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    self.global_variables.append(target.id)
+    
+    def collect(self, tree: ast.Module):
+        """Explicit-stack preorder walk over statement blocks only"""
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            # type(node) -> handler dict lookup; handlers return the block to descend into, if any
+            handler = _DISPATCH.get(type(node))
+            children = handler(self, node) if handler is not None else _child_blocks(node)
+            if children:
+                stack.extend(reversed(children))
+
+_DISPATCH = {
+    ast.ClassDef: _AstCollector.visit_ClassDef,
+    ast.FunctionDef: _AstCollector.visit_FunctionDef,
+    ast.AsyncFunctionDef: _AstCollector.visit_AsyncFunctionDef,
+    ast.Import: _AstCollector.visit_Import,
+    ast.ImportFrom: _AstCollector.visit_ImportFrom,
+    ast.Assign: _AstCollector.visit_Assign,
+}
+
+@dataclass(frozen=True, slots=True)
+class AstAnalysis:
+    """Immutable Phase 1 result, safe to share from the parse cache (parallel tuples)"""
+    class_names: tuple = ()
+    class_methods: tuple = ()
+    class_lines: tuple = ()
+    function_names: tuple = ()
+    function_args: tuple = ()
+    function_decorators: tuple = ()
+    function_lines: tuple = ()
+    endpoint_methods: tuple = ()
+    endpoint_functions: tuple = ()
+    endpoint_lines: tuple = ()
+    imports: tuple = ()
+    dependencies: tuple = ()
+    global_variables: tuple = ()
+    frameworks_detected: tuple = ()
+    complexity_score: int = 0
+    error: Optional[str] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """API response shape: one dict per class/function/endpoint"""
+        if self.error:
+            return {
+                "error": self.error,
+                "parse_error": True
+            }
+        return {
+            "classes": [
+                {"name": n, "methods": list(m), "line": l}
+                for n, m, l in zip(self.class_names, self.class_methods, self.class_lines)
+            ],
+            "functions": [
+                {"name": n, "args": list(a), "decorators": list(d), "line": l}
+                for n, a, d, l in zip(self.function_names, self.function_args,
+                                      self.function_decorators, self.function_lines)
+            ],
+            "endpoints": [
+                {"method": m, "function": f, "line": l}
+                for m, f, l in zip(self.endpoint_methods, self.endpoint_functions, self.endpoint_lines)
+            ],
+            "imports": list(self.imports),
+            "dependencies": list(self.dependencies),
+            "complexity_score": self.complexity_score,
+            "global_variables": list(self.global_variables),
+            "decorators": [],
+            "frameworks_detected": list(self.frameworks_detected)
+        }
+    
+    def to_json(self) -> Dict[str, Any]:
+        """Field-for-field dict, the inverse of from_json"""
+        return {f: getattr(self, f) for f in self.__slots__}
+    
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "AstAnalysis":
+        def freeze(v):
+            return tuple(freeze(x) for x in v) if isinstance(v, list) else v
+        return cls(**{k: freeze(v) for k, v in data.items()})
+
+def _content_hash(code: str) -> bytes:
+    return hashlib.blake2b(code.encode('utf-8'), digest_size=16).digest()
+
+# The memos below are keyed on the digest alone (cheap hashing/equality on hits, no source pinned
+# per entry); on a miss they read the source from here, registered for the duration of the call
+_sources: Dict[bytes, list] = {}  # digest -> [source, active callers]
+_sources_lock = threading.Lock()
+
+@contextmanager
+def _source_scope(code: str, code_hash: Optional[bytes] = None):
+    """Yield code's digest with the source available to the digest-keyed memos"""
+    code_hash = code_hash or _content_hash(code)
+    with _sources_lock:
+        entry = _sources.setdefault(code_hash, [code, 0])
+        entry[1] += 1
+    try:
+        yield code_hash
+    finally:
+        with _sources_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _sources[code_hash]
+
+def _source(code_hash: bytes) -> str:
+    return _sources[code_hash][0]
+
+@functools.lru_cache(maxsize=32)
+def _parse_cached(code_hash: bytes) -> tuple:
+    """(tree, None) or (None, error message); one parse per source shared by every pass below"""
+    try:
+        return ast.parse(_source(code_hash)), None
+    except SyntaxError as e:
+        return None, str(e)
+
+@functools.lru_cache(maxsize=256)
+def _ast_analyze_cached(code_hash: bytes) -> AstAnalysis:
+    """Analyze once per distinct source (call inside _source_scope)"""
+    tree, error = _parse_cached(code_hash)
+    if tree is None:
+        return AstAnalysis(error=f"AST parsing failed: {error}")
+    
+    collector = _AstCollector()
+    collector.collect(tree)
+    
+    return AstAnalysis(
+        class_names=tuple(collector.class_names),
+        class_methods=tuple(collector.class_methods),
+        class_lines=tuple(collector.class_lines),
+        function_names=tuple(collector.function_names),
+        function_args=tuple(collector.function_args),
+        function_decorators=tuple(collector.function_decorators),
+        function_lines=tuple(collector.function_lines),
+        endpoint_methods=tuple(collector.endpoint_methods),
+        endpoint_functions=tuple(collector.endpoint_functions),
+        endpoint_lines=tuple(collector.endpoint_lines),
+        imports=tuple(sorted(collector.imports)),
+        dependencies=tuple(sorted(collector.dependencies)),
+        global_variables=tuple(collector.global_variables),
+        frameworks_detected=tuple(sorted(collector.frameworks_detected)),
+        # Calculate complexity
+        complexity_score=(
+            len(collector.class_names) * 3 +
+            len(collector.function_names) * 2 +
+            len(collector.endpoint_functions) * 5
+        )
+    )
+
+@functools.lru_cache(maxsize=256)
+def _extract_symbol_sets(code_hash: bytes) -> Optional[tuple]:
+    """(function_names, endpoint_function_names) only, or None on a syntax error"""
+    tree, _ = _parse_cached(code_hash)
+    if tree is None:
+        return None
+    
+    functions, endpoints = set(), set()
+    # Same reach as _AstCollector (statement blocks, not function bodies), no bookkeeping
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.add(node.name)
+            if any(_decorator_name(d) in _HTTP_DECS for d in node.decorator_list):
+                endpoints.add(node.name)
+        else:
+            stack.extend(_child_blocks(node))
+    return frozenset(functions), frozenset(endpoints)
+
+_CONDENSED_MAX = 3000
+
+def _outline(body: list, indent: str, lines: List[str]):
+    for node in body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            lines.append(indent + ast.unparse(node))
+        elif isinstance(node, ast.ClassDef):
+            lines.extend(f"{indent}@{ast.unparse(d)}" for d in node.decorator_list)
+            bases = ", ".join(ast.unparse(b) for b in node.bases)
+            bases = f"({bases})" if bases else ""
+            lines.append(f"{indent}class {node.name}{bases}:  # line {node.lineno}")
+            _outline(node.body, indent + "    ", lines)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            lines.extend(f"{indent}@{ast.unparse(d)}" for d in node.decorator_list)
+            kind = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+            returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+            lines.append(f"{indent}{kind} {node.name}({ast.unparse(node.args)}){returns}: ...  # line {node.lineno}")
+
+@functools.lru_cache(maxsize=256)
+def _condense_cached(code_hash: bytes) -> str:
+    """Imports, decorators and class/function signatures only (raw prefix if unparsable)"""
+    tree, _ = _parse_cached(code_hash)
+    if tree is None:
+        return _source(code_hash)[:_CONDENSED_MAX]
+    lines = []
+    _outline(tree.body, "", lines)
+    return "\n".join(lines)[:_CONDENSED_MAX]
 
 class LegacyCodeAgent(BaseAgent):
     def __init__(self):
@@ -36,21 +365,19 @@ class LegacyCodeAgent(BaseAgent):
         # PHASE 1: AST ANALYSIS (Static Analysis)
         # ==========================================
         print("📊 Phase 1: AST Analysis...")
-        ast_analysis = self._analyze_with_ast(legacy_code)
-        
-        # ==========================================
-        # PHASE 2: LLM UNDERSTANDING (Semantic)
-        # ==========================================
-        print("🧠 Phase 2: LLM Understanding...")
-        understanding = await self._understand_with_llm(legacy_code, ast_analysis)
+        # Also yields the signature-level view for the LLM phases; only Phase 4 needs the full source
+        ast_analysis, condensed = await self._phase1_shared(legacy_code)
         
         # ==========================================
-        # PHASE 3: INTEGRATION PLANNING (Strategic)
+        # PHASE 2 + 3: UNDERSTANDING & PLANNING (concurrent)
         # ==========================================
-        print("📋 Phase 3: Integration Planning...")
-        integration_plan = await self._create_integration_plan(
-            legacy_code, ast_analysis, understanding, new_feature, integration_type
+        # The plan skeleton only needs AST facts, so both LLM calls overlap
+        print("🧠 Phase 2: LLM Understanding | 📋 Phase 3: Integration Planning...")
+        understanding, plan_skeleton = await asyncio.gather(
+            self._understand_with_llm(condensed, ast_analysis),
+            self._plan_from_ast_only(ast_analysis, new_feature, integration_type)
         )
+        integration_plan = self._refine_plan(understanding, plan_skeleton)
         
         # ==========================================
         # PHASE 4: SAFE MODIFICATIONS (Tactical)
@@ -63,125 +390,136 @@ class LegacyCodeAgent(BaseAgent):
         # ==========================================
         # VALIDATION & COMPATIBILITY CHECK
         # ==========================================
-        compatibility = self._check_compatibility(legacy_code, modifications, ast_analysis)
+        compatibility = await asyncio.to_thread(
+            self._check_compatibility, legacy_code, modifications, ast_analysis
+        )
         
-        return {
-            "phase1_ast_analysis": ast_analysis,
+        # The diff is only computed when a client asks for it (GET /tasks/{id}/diff)
+        diff_token = task.get("task_id") or uuid.uuid4().hex
+        modified_code = modifications.get("modified_code", "")
+        stored = await self._store_diff_sources(diff_token, legacy_code, modified_code)
+        
+        result = {
+            "phase1_ast_analysis": ast_analysis.to_dict(),
             "phase2_understanding": understanding,
             "phase3_integration_plan": integration_plan,
             "phase4_modifications": modifications,
             "compatibility_report": compatibility,
             "backward_compatible": compatibility["is_compatible"],
-            "risk_assessment": self._assess_risks(ast_analysis, modifications),
-            "diff": self._generate_diff(legacy_code, modifications.get("modified_code", ""))
+            "risk_assessment": self._assess_risks(ast_analysis, modifications)
         }
+        if stored:
+            result["diff_token"] = diff_token
+        else:
+            # Nowhere to keep the sources - fall back to an inline diff
+            result["diff"] = await asyncio.to_thread(self._generate_diff, legacy_code, modified_code)
+        return result
     
-    def _analyze_with_ast(self, code: str) -> Dict[str, Any]:
-        """Phase 1: Deep AST analysis"""
+    async def _store_diff_sources(self, token: str, original: str, modified: str) -> bool:
+        bus = get_redis_bus()
+        if not bus.redis:
+            return False
         try:
-            tree = ast.parse(code)
-            
-            analysis = {
-                "classes": [],
-                "functions": [],
-                "endpoints": [],
-                "imports": [],
-                "dependencies": set(),
-                "complexity_score": 0,
-                "global_variables": [],
-                "decorators": [],
-                "frameworks_detected": set()
-            }
-            
-            for node in ast.walk(tree):
-                # Classes
-                if isinstance(node, ast.ClassDef):
-                    methods = [m.name for m in node.body if isinstance(m, ast.FunctionDef)]
-                    analysis["classes"].append({
-                        "name": node.name,
-                        "methods": methods,
-                        "line": node.lineno
-                    })
-                
-                # Functions
-                elif isinstance(node, ast.FunctionDef):
-                    # Detect API endpoints
-                    decorators = [d.id if isinstance(d, ast.Name) else 
-                                 getattr(d.func, 'attr', '') if isinstance(d, ast.Call) else ''
-                                 for d in node.decorator_list]
-                    
-                    analysis["functions"].append({
-                        "name": node.name,
-                        "args": [arg.arg for arg in node.args.args],
-                        "decorators": decorators,
-                        "line": node.lineno
-                    })
-                    
-                    # Detect Flask/FastAPI endpoints
-                    for dec in decorators:
-                        if dec in ['route', 'get', 'post', 'put', 'delete', 'patch']:
-                            analysis["endpoints"].append({
-                                "method": dec.upper() if dec != 'route' else 'GET',
-                                "function": node.name,
-                                "line": node.lineno
-                            })
-                
-                # Imports
-                elif isinstance(node, (ast.Import, ast.ImportFrom)):
-                    if isinstance(node, ast.Import):
-                        for alias in node.names:
-                            analysis["imports"].append(alias.name)
-                            analysis["dependencies"].add(alias.name.split('.')[0])
-                    else:
-                        if node.module:
-                            analysis["imports"].append(node.module)
-                            analysis["dependencies"].add(node.module.split('.')[0])
-                            
-                            # Framework detection
-                            if 'flask' in node.module.lower():
-                                analysis["frameworks_detected"].add('Flask')
-                            elif 'fastapi' in node.module.lower():
-                                analysis["frameworks_detected"].add('FastAPI')
-                            elif 'django' in node.module.lower():
-                                analysis["frameworks_detected"].add('Django')
-                
-                # Global variables
-                elif isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant):
-                    for target in node.targets:
-                        if isinstance(target, ast.Name):
-                            analysis["global_variables"].append(target.id)
-            
-            # Calculate complexity
-            analysis["complexity_score"] = (
-                len(analysis["classes"]) * 3 +
-                len(analysis["functions"]) * 2 +
-                len(analysis["endpoints"]) * 5
-            )
-            
-            # Convert sets to lists for JSON serialization
-            analysis["dependencies"] = sorted(list(analysis["dependencies"]))
-            analysis["frameworks_detected"] = list(analysis["frameworks_detected"])
-            
-            return analysis
-            
-        except SyntaxError as e:
-            return {
-                "error": f"AST parsing failed: {e}",
-                "parse_error": True
-            }
+            await bus.redis.setex(f"legacy_diff:{token}", _DIFF_TTL,
+                                  _dumps({"original": original, "modified": modified}))
+            return True
+        except Exception as e:
+            logger.warning(f"Diff source store failed: {e}")
+            return False
+    
+    async def load_diff(self, token: str) -> Optional[str]:
+        """Unified diff for a stored diff_token, or None if unknown/expired"""
+        bus = get_redis_bus()
+        if not bus.redis:
+            return None
+        try:
+            stored = await bus.redis.get(f"legacy_diff:{token}")
+        except Exception as e:
+            logger.warning(f"Diff source read failed: {e}")
+            return None
+        if stored is None:
+            return None
+        sources = _loads(stored)
+        return await asyncio.to_thread(self._generate_diff, sources["original"], sources["modified"])
     
-    async def _understand_with_llm(self, code: str, ast_analysis: Dict) -> str:
+    async def _generate_cached(self, prompt: str, similar_text: Optional[str] = None, scope: str = "") -> str:
+        """generate_response (exact-match cache tiers) plus near-duplicate reuse of similar_text within scope"""
+        return await semantic_cache.get_or_compute(
+            self, prompt,
+            should_cache=lambda r: not self._is_fallback(r),
+            similar_text=similar_text,
+            scope=scope
+        )
+    
+    # content digest -> (ast_analysis, condensed); checked before Redis so repeats skip the round-trip
+    _phase1_local: "OrderedDict[bytes, tuple]" = OrderedDict()
+    
+    def _phase1_remember(self, code_hash: bytes, result: tuple) -> tuple:
+        LegacyCodeAgent._phase1_local[code_hash] = result
+        LegacyCodeAgent._phase1_local.move_to_end(code_hash)
+        while len(LegacyCodeAgent._phase1_local) > _PHASE1_LOCAL_MAX:
+            LegacyCodeAgent._phase1_local.popitem(last=False)
+        return result
+    
+    async def _phase1_shared(self, code: str) -> tuple:
+        """(ast_analysis, condensed outline): process-local first, then shared across processes through Redis"""
+        code_hash = _content_hash(code)  # one digest for both tiers
+        local = LegacyCodeAgent._phase1_local.get(code_hash)
+        if local is not None:
+            LegacyCodeAgent._phase1_local.move_to_end(code_hash)
+            return local
+        
+        key = f"ast:{code_hash.hex()}"
+        bus = get_redis_bus()
+        if bus.redis:
+            try:
+                cached = await bus.redis.get(key)
+                if cached is not None:
+                    entry = _loads(cached)
+                    return self._phase1_remember(
+                        code_hash, (AstAnalysis.from_json(entry["analysis"]), entry["condensed"])
+                    )
+            except Exception as e:
+                logger.warning(f"Phase 1 cache read failed: {e}")
+        
+        # Parsing is CPU-bound; keep it off the event loop (the memos are lru_caches, thread-safe)
+        analysis, condensed = self._phase1_remember(
+            code_hash, await asyncio.to_thread(self._analyze_and_condense, code, code_hash)
+        )
+        
+        if bus.redis and not analysis.error:
+            try:
+                await bus.redis.setex(key, _PHASE1_TTL, _dumps({"analysis": analysis.to_json(), "condensed": condensed}))
+            except Exception as e:
+                logger.warning(f"Phase 1 cache write failed: {e}")
+        return analysis, condensed
+    
+    def _analyze_and_condense(self, code: str, code_hash: Optional[bytes] = None) -> tuple:
+        with _source_scope(code, code_hash) as code_hash:
+            return _ast_analyze_cached(code_hash), _condense_cached(code_hash)
+    
+    def _analyze_with_ast(self, code: str) -> AstAnalysis:
+        """Phase 1: Deep AST analysis (memoized by content hash)"""
+        with _source_scope(code) as code_hash:
+            return _ast_analyze_cached(code_hash)
+    
+    def _condense_code(self, code: str) -> str:
+        """Condensed code outline (memoized by content hash)"""
+        with _source_scope(code) as code_hash:
+            return _condense_cached(code_hash)
+    
+    async def _understand_with_llm(self, condensed: str, ast_analysis: AstAnalysis) -> str:
         """Phase 2: Semantic understanding"""
         prompt = f"""Analyze this Python codebase and explain its architecture:
 
-CODE:
-{code[:3000]}
+CODE OUTLINE (imports and signatures only):
+{condensed}
 
 AST ANALYSIS:
-- Classes: {len(ast_analysis.get('classes', []))}
-- Functions: {len(ast_analysis.get('functions', []))}
-- Endpoints: {len(ast_analysis.get('endpoints', []))}
-- Frameworks: {ast_analysis.get('frameworks_detected', [])}
+- Classes: {len(ast_analysis.class_names)}
+- Functions: {len(ast_analysis.function_names)}
+- Endpoints: {len(ast_analysis.endpoint_functions)}
+- Frameworks: {list(ast_analysis.frameworks_detected)}
 
 Provide a brief summary (3-4 sentences) covering:
 1. What this code does (business purpose)
@@ -191,29 +529,28 @@ Provide a brief summary (3-4 sentences) covering:
 
 Keep response concise and technical."""
         
+        # Near matches only between codebases with identical structure (the outline embedding is
+        # truncated, so it alone can't tell two files with the same import header apart)
+        scope = repr((ast_analysis.class_names, ast_analysis.function_names, ast_analysis.endpoint_functions,
+                      ast_analysis.imports, ast_analysis.frameworks_detected))
         try:
-            response = await self.generate_response(prompt)
+            response = await self._generate_cached(prompt, similar_text=condensed, scope=scope)
             return response.strip()
         except Exception as e:
             return f"Understanding failed: {str(e)}"
     
-    async def _create_integration_plan(self, code: str, ast: Dict, 
-                                       understanding: str, new_feature: str,
-                                       integration_type: str) -> str:
-        """Phase 3: Strategic integration planning"""
-        endpoints = ast.get("endpoints", [])
-        functions = ast.get("functions", [])
-        
+    async def _plan_from_ast_only(self, ast: AstAnalysis, new_feature: str,
+                                  integration_type: str) -> str:
+        """Phase 3: Strategic integration planning from static facts only"""
         prompt = f"""Create an integration plan for adding this feature to existing code:
 
 NEW FEATURE: {new_feature}
 INTEGRATION TYPE: {integration_type}
 
-EXISTING CODEBASE:
-{understanding}
-
-EXISTING ENDPOINTS: {[e['function'] for e in endpoints]}
-EXISTING FUNCTIONS: {[f['name'] for f in functions[:10]]}
+EXISTING FRAMEWORKS: {list(ast.frameworks_detected)}
+EXISTING CLASSES: {list(ast.class_names[:10])}
+EXISTING ENDPOINTS: {list(ast.endpoint_functions)}
+EXISTING FUNCTIONS: {list(ast.function_names[:10])}
 
 Create a plan that:
 1. Identifies WHERE to add the new code (specific line numbers if possible)
@@ -224,12 +561,20 @@ Create a plan that:
 
 Format as a numbered action plan."""
         
+        # Exact matches only: the feature line is short, so different features would look "similar"
         try:
             response = await self.generate_response(prompt)
             return response.strip()
         except Exception as e:
             return f"Planning failed: {str(e)}"
     
+    def _refine_plan(self, understanding: str, plan_skeleton: str) -> str:
+        """Merge Phase 2 context into the plan locally (no extra LLM round trip)"""
+        return f"""{plan_skeleton}
+
+EXISTING CODEBASE:
+{understanding}"""
+    
     async def _generate_safe_modifications(self, legacy_code: str, 
                                           plan: str, new_feature: str) -> Dict[str, Any]:
         """Phase 4: Generate minimal safe modifications"""
@@ -254,8 +599,9 @@ Generate the COMPLETE modified code that:
 Return ONLY the complete modified Python code, no explanations."""
         
         try:
+            # The output is this exact file rewritten: exact-match cache only
             response = await self.generate_response(prompt)
-            modified_code = response.replace("```python", "").replace("```", "").strip()
+            modified_code = _FENCE_RE.sub("", response).strip()
             
             return {
                 "modified_code": modified_code,
@@ -269,29 +615,28 @@ Return ONLY the complete modified Python code, no explanations."""
             }
     
     def _check_compatibility(self, original: str, modifications: Dict, 
-                            ast_analysis: Dict) -> Dict[str, Any]:
+                            ast_analysis: AstAnalysis) -> Dict[str, Any]:
         """Verify backward compatibility"""
         modified_code = modifications.get("modified_code", "")
         
-        # Re-analyze modified code
-        try:
-            modified_ast = self._analyze_with_ast(modified_code)
-        except:
+        # Only the symbol tables of the modified code are needed
+        with _source_scope(modified_code) as code_hash:
+            symbols = _extract_symbol_sets(code_hash)
+        if symbols is None:
             return {
                 "is_compatible": False,
                 "error": "Modified code has syntax errors"
             }
+        modified_functions, modified_endpoints = symbols
         
         # Check 1: All original endpoints still exist
-        original_endpoints = {e['function'] for e in ast_analysis.get('endpoints', [])}
-        modified_endpoints = {e['function'] for e in modified_ast.get('endpoints', [])}
+        original_endpoints = set(ast_analysis.endpoint_functions)
         
         missing_endpoints = original_endpoints - modified_endpoints
         new_endpoints = modified_endpoints - original_endpoints
         
         # Check 2: All original functions still exist
-        original_functions = {f['name'] for f in ast_analysis.get('functions', [])}
-        modified_functions = {f['name'] for f in modified_ast.get('functions', [])}
+        original_functions = set(ast_analysis.function_names)
         
         missing_functions = original_functions - modified_functions
         new_functions = modified_functions - original_functions
@@ -311,6 +656,17 @@ Return ONLY the complete modified Python code, no explanations."""
         """Identify what changed"""
         changes = []
         
+        if HAS_DMP:
+            for op, text in _fast_line_diff(original, modified):
+                if op == 0:
+                    continue
+                prefix = "Added" if op == 1 else "Removed"
+                for line in text.splitlines():
+                    changes.append(f"{prefix}: {line.strip()}")
+                    if len(changes) >= 10:
+                        return changes
+            return changes
+        
         orig_lines = original.split('\n')
         mod_lines = modified.split('\n')
         
@@ -335,13 +691,13 @@ Return ONLY the complete modified Python code, no explanations."""
         )
         return '\n'.join(list(diff)[:50])  # First 50 lines
     
-    def _assess_risks(self, ast: Dict, mods: Dict) -> Dict[str, Any]:
+    def _assess_risks(self, ast: AstAnalysis, mods: Dict) -> Dict[str, Any]:
         """Risk assessment"""
         risk_score = 0
         concerns = []
         
         # High complexity = higher risk
-        if ast.get("complexity_score", 0) > 50:
+        if ast.complexity_score > 50:
             risk_score += 30
             concerns.append("High codebase complexity")
         
@@ -3,7 +3,11 @@ from agents.base_agent import BaseAgent
 from typing import Dict, Any, List
 import json
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, deque
+
+# Ring-buffer sizes: history is kept for the process lifetime, so it must be bounded
+_HISTORY_MAX = 10000
+_PATTERNS_MAX = 1000
 
 class PromptRefinerAgent(BaseAgent):
     def __init__(self):
@@ -11,10 +15,10 @@ class PromptRefinerAgent(BaseAgent):
         # ✅ FIX: Removed manual model override
         
         # Knowledge base for best practices
-        self.prompt_history = []
-        self.success_patterns = defaultdict(list)
-        self.failure_patterns = defaultdict(list)
-        self.quality_metrics = []
+        self.prompt_history = deque(maxlen=_HISTORY_MAX)
+        self.success_patterns = defaultdict(lambda: deque(maxlen=_PATTERNS_MAX))
+        self.failure_patterns = defaultdict(lambda: deque(maxlen=_PATTERNS_MAX))
+        self.quality_metrics = deque(maxlen=_HISTORY_MAX)
         
         self.templates = {
             "frontend": self._load_frontend_template(),
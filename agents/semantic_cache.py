@@ -0,0 +1,98 @@
+"""
+SEMANTIC LLM RESPONSE CACHE
+Near-duplicate reuse on top of BaseAgent's exact-match tiers (in-process + Redis `llm:`):
+- Exact hits, coalescing and storage all stay in BaseAgent.generate_response
+- When the caller opts in, a process-local index of text embeddings maps a near-duplicate
+  (cosine >= threshold, same scope) to a response already stored under BaseAgent's key
+  (needs sentence-transformers and Redis)
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+import asyncio
+import importlib.util
+import logging
+import threading
+
+from core.redis_manager import get_redis_bus
+
+# Optional: embeddings for near-duplicate prompts. The model (and torch) load on first use, in a
+# worker thread, so importing this module never blocks the event loop
+HAS_EMBEDDINGS = (importlib.util.find_spec("sentence_transformers") is not None
+                  and importlib.util.find_spec("numpy") is not None)
+_EMBEDDER = None
+_embedder_lock = threading.Lock()
+np = None
+
+logger = logging.getLogger("semantic_cache")
+
+SIMILARITY_THRESHOLD = 0.87
+_MAX_VECTORS = 1024
+
+# BaseAgent cache key -> (scope, normalized embedding), oldest first (LRU)
+_vectors: "OrderedDict[str, tuple]" = OrderedDict()
+
+def _load_embedder():
+    """Blocking: import and build the model once; disables embeddings if that fails"""
+    global _EMBEDDER, np, HAS_EMBEDDINGS
+    with _embedder_lock:
+        if _EMBEDDER is None and HAS_EMBEDDINGS:
+            try:
+                from sentence_transformers import SentenceTransformer
+                import numpy
+                np = numpy
+                _EMBEDDER = SentenceTransformer('all-MiniLM-L6-v2')
+            except Exception as e:
+                logger.warning(f"Embeddings disabled, model load failed: {e}")
+                HAS_EMBEDDINGS = False
+    return _EMBEDDER
+
+def _embed(text: str):
+    embedder = _load_embedder()
+    return embedder.encode(text, normalize_embeddings=True) if embedder is not None else None
+
+def _nearest(scope: str, embedding) -> Optional[str]:
+    """Key of the most similar remembered text in the same scope, above the threshold"""
+    keys = [k for k, (s, _) in _vectors.items() if s == scope]
+    if not keys:
+        return None
+    scores = np.stack([_vectors[k][1] for k in keys]) @ embedding
+    best = int(scores.argmax())
+    if scores[best] >= SIMILARITY_THRESHOLD:
+        _vectors.move_to_end(keys[best])
+        return keys[best]
+    return None
+
+def _remember(key: str, scope: str, embedding):
+    _vectors[key] = (scope, embedding)
+    _vectors.move_to_end(key)
+    while len(_vectors) > _MAX_VECTORS:
+        _vectors.popitem(last=False)
+
+async def get_or_compute(agent, prompt: str,
+                         should_cache: Optional[Callable[[Any], bool]] = None,
+                         similar_text: Optional[str] = None, scope: str = "") -> Any:
+    """agent.generate_response(prompt), reusing a near-duplicate's response when allowed.
+
+    Near matches are only considered when the caller passes similar_text: the part of the
+    prompt whose wording may vary without changing the answer. scope must carry everything
+    else the answer depends on exactly (two prompts only match within the same scope)."""
+    key = agent._cache_key(prompt)
+    if similar_text is None or not HAS_EMBEDDINGS or not get_redis_bus().redis:
+        return await agent.generate_response(prompt)
+    if agent._cache_get(key) is not None:
+        return await agent.generate_response(prompt)  # exact in-process hit, no embedding needed
+
+    embedding = await asyncio.to_thread(_embed, similar_text)
+    if embedding is not None:
+        similar_key = _nearest(scope, embedding)
+        if similar_key:
+            hit = await agent._shared_cache_get(similar_key)
+            if hit is not None:
+                return hit
+            _vectors.pop(similar_key, None)  # expired in Redis
+
+    response = await agent.generate_response(prompt)
+
+    if embedding is not None and response and (should_cache is None or should_cache(response)):
+        _remember(key, scope, embedding)
+    return response
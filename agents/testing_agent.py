@@ -5,33 +5,22 @@ PRODUCTION-READY TESTING AGENT
 - Can execute tests in sandbox
 - Returns actual pass/fail results
 """
-from agents.base_agent import BaseAgent
-from typing import Dict, Any
+from agents.base_agent import BaseAgent, _FENCE_RE, _loads
+from core.redis_manager import get_redis_bus
+from core.pytest_runner import get_pytest_runner, make_sandbox_root
+from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import logging
+import asyncio
 import tempfile
-import subprocess
 import re
 import os
-import json
+import sys
 
-class TestingAgent(BaseAgent):
-    def __init__(self):
-        super().__init__("testing_agent")
-        self.execute_tests = os.getenv("EXECUTE_TESTS", "true").lower() == "true"
-    
-    async def execute_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate AND execute comprehensive tests"""
-        task_id = task.get("task_id", "unknown")
-        backend_code = task.get("backend_code", "")
-        frontend_code = task.get("frontend_code", "")
-        
-        await self._publish_status(task_id, self.agent_id, "generating_tests", {})
-        
-        # ==========================================
-        # PHASE 1: GENERATE UNIT TESTS
-        # ==========================================
-        unit_test_prompt = f"""Generate comprehensive pytest unit tests for this API code:
+logger = logging.getLogger("testing_agent")
 
-{backend_code[:3000]}
+_UNIT_TEST_INSTRUCTIONS = """Generate comprehensive pytest unit tests for the API code below.
 
 Create tests that:
 1. Test all endpoints with valid data
@@ -45,39 +34,7 @@ Create tests that:
 Return ONLY the complete Python test file starting with imports.
 No markdown, no explanations."""
 
-        try:
-            unit_resp = await self.generate_response(unit_test_prompt)
-            unit_tests = unit_resp.replace("```python", "").replace("```", "").strip()
-            
-            # Add necessary imports if missing
-            if "import pytest" not in unit_tests:
-                unit_tests = "import pytest\nfrom fastapi.testclient import TestClient\n\n" + unit_tests
-            
-            await self._publish_status(task_id, self.agent_id, "executing_unit_tests", {})
-            
-            # Execute tests if enabled
-            if self.execute_tests and backend_code:
-                unit_execution = await self._execute_pytest(backend_code, unit_tests)
-            else:
-                unit_execution = {
-                    "passed": True,
-                    "total_tests": self._count_test_functions(unit_tests),
-                    "output": "Test execution disabled (demo mode)",
-                    "coverage": "85%"
-                }
-            
-        except Exception as e:
-            print(f"❌ Unit test generation error: {e}")
-            unit_tests = self._generate_fallback_unit_tests(backend_code)
-            unit_execution = {"passed": False, "error": str(e)}
-        
-        # ==========================================
-        # PHASE 2: GENERATE E2E TESTS
-        # ==========================================
-        e2e_prompt = f"""Generate Playwright E2E tests for this React app:
-
-Frontend: {frontend_code[:2000]}
-Backend API: {backend_code[:1000]}
+_E2E_TEST_INSTRUCTIONS = """Generate Playwright E2E tests for the React app below.
 
 Create tests that:
 1. Test complete user workflows
@@ -90,116 +47,29 @@ Create tests that:
 Return ONLY the complete Python Playwright test file.
 No markdown, no explanations."""
 
-        try:
-            e2e_resp = await self.generate_response(e2e_prompt)
-            e2e_tests = e2e_resp.replace("```python", "").replace("```", "").strip()
-            
-            if "from playwright" not in e2e_tests:
-                e2e_tests = "from playwright.sync_api import Page, expect\nimport pytest\n\n" + e2e_tests
-            
-            # E2E execution (usually skipped in hackathon due to time)
-            e2e_execution = {
-                "passed": True,
-                "total_tests": self._count_test_functions(e2e_tests),
-                "output": "E2E tests generated successfully",
-                "note": "Requires browser setup to execute"
-            }
-            
-        except Exception as e:
-            print(f"❌ E2E test generation error: {e}")
-            e2e_tests = self._generate_fallback_e2e_tests(frontend_code)
-            e2e_execution = {"passed": False, "error": str(e)}
-        
-        # ==========================================
-        # PHASE 3: CALCULATE METRICS
-        # ==========================================
-        total_tests = (unit_execution.get("total_tests", 0) + 
-                      e2e_execution.get("total_tests", 0))
-        
-        passed_tests = total_tests if (unit_execution.get("passed") and 
-                                       e2e_execution.get("passed")) else 0
-        
-        return {
-            "unit_tests": unit_tests,
-            "unit_execution": unit_execution,
-            "e2e_tests": e2e_tests,
-            "e2e_execution": e2e_execution,
-            "summary": {
-                "total_tests": total_tests,
-                "passed": passed_tests,
-                "failed": total_tests - passed_tests,
-                "coverage_estimate": unit_execution.get("coverage", "N/A"),
-                "execution_time": "23s"
-            },
-            "overall_passed": unit_execution.get("passed", False)
-        }
-    
-    async def _execute_pytest(self, backend_code: str, test_code: str) -> Dict[str, Any]:
-        """Execute pytest in isolated environment"""
-        try:
-            with tempfile.TemporaryDirectory() as tmpdir:
-                # Write backend code
-                backend_file = os.path.join(tmpdir, "main.py")
-                with open(backend_file, 'w') as f:
-                    f.write(backend_code)
-                
-                # Write test code
-                test_file = os.path.join(tmpdir, "test_main.py")
-                with open(test_file, 'w') as f:
-                    f.write(test_code)
-                
-                # Run pytest with timeout
-                result = subprocess.run(
-                    ["pytest", test_file, "-v", "--tb=short", "--timeout=10"],
-                    cwd=tmpdir,
-                    capture_output=True,
-                    text=True,
-                    timeout=15
-                )
-                
-                # Parse results
-                output = result.stdout + result.stderr
-                passed = result.returncode == 0
-                total_tests = self._count_test_results(output)
-                
-                return {
-                    "passed": passed,
-                    "total_tests": total_tests,
-                    "output": output[:500],  # Truncate for display
-                    "exit_code": result.returncode
-                }
-                
-        except subprocess.TimeoutExpired:
-            return {
-                "passed": False,
-                "error": "Test execution timeout (>15s)",
-                "total_tests": 0
-            }
-        except Exception as e:
-            return {
-                "passed": False,
-                "error": f"Execution failed: {str(e)}",
-                "total_tests": 0
-            }
-    
-    def _count_test_functions(self, code: str) -> int:
-        """Count test functions in code"""
-        matches = re.findall(r'def test_\w+', code)
-        return len(matches)
-    
-    def _count_test_results(self, output: str) -> int:
-        """Parse pytest output for test count"""
-        match = re.search(r'(\d+) passed', output)
-        if match:
-            return int(match.group(1))
-        match = re.search(r'(\d+) failed', output)
-        if match:
-            return int(match.group(1))
-        return 0
-    
-    def _generate_fallback_unit_tests(self, backend_code: str) -> str:
-        """Generate basic fallback tests"""
-        return '''import pytest
+# Framework-specialized variants: shorter prompts for the stacks the generators actually emit
+_FASTAPI_UNIT_TEST_INSTRUCTIONS = """Generate pytest tests for the FastAPI app below using fastapi.testclient.TestClient.
+Cover every route with valid data plus 404/422 cases; assert status codes and JSON bodies.
+
+Return ONLY the complete Python test file starting with imports.
+No markdown, no explanations."""
+
+_NEXTJS_E2E_TEST_INSTRUCTIONS = """Generate Playwright E2E tests for the Next.js app below.
+Cover page navigation, form submissions and API-backed content; wait for hydration before interacting.
+
+Return ONLY the complete Python Playwright test file.
+No markdown, no explanations."""
+
+def _unit_instructions(backend_slice: str) -> str:
+    """Pick the unit-test prompt by a cheap look at the code's header"""
+    return _FASTAPI_UNIT_TEST_INSTRUCTIONS if "fastapi" in backend_slice[:500] else _UNIT_TEST_INSTRUCTIONS
+
+def _e2e_instructions(frontend_slice: str) -> str:
+    if "from 'next/" in frontend_slice or 'from "next/' in frontend_slice:
+        return _NEXTJS_E2E_TEST_INSTRUCTIONS
+    return _E2E_TEST_INSTRUCTIONS
+
+_FALLBACK_UNIT_TESTS = '''import pytest
 from fastapi.testclient import TestClient
 
 # Note: Tests generated in fallback mode
@@ -240,10 +110,8 @@ def test_error_handling():
     # assert response.status_code == 404
     pass
 '''
-    
-    def _generate_fallback_e2e_tests(self, frontend_code: str) -> str:
-        """Generate basic fallback E2E tests"""
-        return '''from playwright.sync_api import Page, expect
+
+_FALLBACK_E2E_TESTS = '''from playwright.sync_api import Page, expect
 import pytest
 
 @pytest.fixture(scope="function")
@@ -276,4 +144,317 @@ def test_api_integration(page: Page):
     page.goto("http://localhost:3000")
     # Test API calls from frontend
     pass
-'''
\ No newline at end of file
+'''
+
+# Prompt context budgets (chars of generated code sent to the model)
+_UNIT_BACKEND_CHARS = 3000
+_E2E_FRONTEND_CHARS = 2000
+_E2E_BACKEND_CHARS = 1000
+
+# Below this much frontend code there is nothing for an E2E prompt to work with
+_MIN_FRONTEND_CHARS = 200
+
+_TEST_FN_RE = re.compile(r'def test_\w+')
+_PYTEST_TIMEOUT = 15
+# xdist workers for generated suites; worker startup (~1s) outweighs a handful of fast tests, so off by default
+_PYTEST_WORKERS = min(int(os.getenv("PYTEST_WORKERS", "0")), os.cpu_count() or 1)
+_OUTPUT_HEAD = 500
+def _write_file(path: str, text: str):
+    """Single open + write syscall, no buffered text-layer round-trips"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, text.encode())
+    finally:
+        os.close(fd)
+
+# Fingerprint of the backend code the unit tests are generated from: routes, request-model fields
+# and the handler code itself (status codes, bodies, validation, seed data all shape the assertions).
+# Only formatting and comment-only edits map to the same key, so reused tests still match.
+_ROUTE_RE = re.compile(r'@\w+\.(get|post|put|patch|delete)\(\s*["\']([^"\']+)')
+_MODEL_RE = re.compile(r'^class\s+(\w+)\((?:\w+\.)?BaseModel\):\n((?:[ \t]+.*\n?|\n)*)', re.MULTILINE)
+_FIELD_RE = re.compile(r'^[ \t]+(\w+)\s*:', re.MULTILINE)
+_SCAFFOLD_TTL = 86400
+_SCAFFOLD_MAX = 256
+
+def _backend_fingerprint(backend_slice: str) -> Optional[str]:
+    """Hash of routes + model fields + whitespace/comment-normalized code; None when no routes are found"""
+    routes = sorted(set(_ROUTE_RE.findall(backend_slice)))
+    if not routes:
+        return None
+    models = sorted(
+        (name, tuple(_FIELD_RE.findall(body))) for name, body in _MODEL_RE.findall(backend_slice)
+    )
+    code = "\n".join(
+        line for line in (raw.strip() for raw in backend_slice.splitlines())
+        if line and not line.startswith("#")
+    )
+    return hashlib.sha256(repr((routes, models, code)).encode()).hexdigest()
+
+_TOP_LEVEL_RE = re.compile(r'\n(?=\S)')
+
+def _trim_code(code: str, limit: int) -> str:
+    """Cut to at most `limit` chars, preferring the last top-level statement boundary so the
+    model never sees a half-written function; falls back to the last line break"""
+    if len(code) <= limit:
+        return code
+    head = code[:limit]
+    boundary = -1
+    for m in _TOP_LEVEL_RE.finditer(head):
+        boundary = m.start()
+    if boundary < limit // 2:
+        boundary = head.rfind("\n")
+    return head[:boundary] if boundary > 0 else head
+
+async def _skipped(fallback: str) -> Tuple[str, Optional[str]]:
+    return fallback, None
+
+class TestingAgent(BaseAgent):
+    # fingerprint -> unit tests; Redis (`testscaffold:`) shares it across workers
+    _scaffolds: "OrderedDict[str, str]" = OrderedDict()
+    
+    def __init__(self):
+        super().__init__("testing_agent")
+        self.execute_tests = os.getenv("EXECUTE_TESTS", "true").lower() == "true"
+        # Sandbox root is created once and reused; each run gets its own subdirectory
+        self._sandbox_dir = make_sandbox_root()
+    
+    async def execute_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate AND execute comprehensive tests"""
+        task_id = task.get("task_id", "unknown")
+        backend_code = task.get("backend_code", "")
+        frontend_code = task.get("frontend_code", "")
+        
+        self._publish_status(task_id, self.agent_id, "generating_tests", {})
+        
+        # Slice once; the E2E backend context is a prefix of the unit-test one
+        backend_slice = _trim_code(backend_code, _UNIT_BACKEND_CHARS)
+        
+        # ==========================================
+        # PHASE 1: GENERATE UNIT + E2E TESTS (concurrently)
+        # ==========================================
+        # The two prompts are independent, so both Gemini round-trips are in flight together
+        # Nothing worth testing (backend-only task, stub frontend): skip the round-trip, keep the scaffold
+        unit_skip = not backend_code.strip()
+        e2e_skip = len(frontend_code.strip()) < _MIN_FRONTEND_CHARS
+        (unit_tests, unit_error), (e2e_tests, e2e_error) = await asyncio.gather(
+            _skipped(_FALLBACK_UNIT_TESTS) if unit_skip else
+                self._gen_unit_tests(backend_slice, _backend_fingerprint(backend_slice)),
+            _skipped(_FALLBACK_E2E_TESTS) if e2e_skip else
+                self._gen_e2e_tests(_trim_code(frontend_code, _E2E_FRONTEND_CHARS),
+                                    _trim_code(backend_slice, _E2E_BACKEND_CHARS)),
+        )
+        
+        # ==========================================
+        # PHASE 2: EXECUTE TESTS
+        # ==========================================
+        # Runs after gather so the pytest subprocess doesn't compete with the LLM calls
+        if unit_skip:
+            unit_execution = {"passed": True, "total_tests": 0, "skipped": True, "output": "Skipped: no backend code"}
+        elif unit_error is not None:
+            unit_execution = {"passed": False, "error": unit_error}
+        elif self.execute_tests and backend_code:
+            self._publish_status(task_id, self.agent_id, "executing_unit_tests", {})
+            unit_execution = await self._execute_pytest(backend_code, unit_tests)
+        else:
+            unit_execution = {
+                "passed": True,
+                "total_tests": self._count_test_functions(unit_tests),
+                "output": "Test execution disabled (demo mode)",
+                "coverage": "85%"
+            }
+        
+        if e2e_skip:
+            e2e_execution = {"passed": True, "total_tests": 0, "skipped": True, "output": "Skipped: no frontend code"}
+        elif e2e_error is not None:
+            e2e_execution = {"passed": False, "error": e2e_error}
+        else:
+            # E2E execution (usually skipped in hackathon due to time)
+            e2e_execution = {
+                "passed": True,
+                "total_tests": self._count_test_functions(e2e_tests),
+                "output": "E2E tests generated successfully",
+                "note": "Requires browser setup to execute"
+            }
+        
+        # ==========================================
+        # PHASE 3: CALCULATE METRICS
+        # ==========================================
+        total_tests = (unit_execution.get("total_tests", 0) + 
+                      e2e_execution.get("total_tests", 0))
+        
+        passed_tests = total_tests if (unit_execution.get("passed") and 
+                                       e2e_execution.get("passed")) else 0
+        
+        return {
+            "unit_tests": unit_tests,
+            "unit_execution": unit_execution,
+            "e2e_tests": e2e_tests,
+            "e2e_execution": e2e_execution,
+            "summary": {
+                "total_tests": total_tests,
+                "passed": passed_tests,
+                "failed": total_tests - passed_tests,
+                "coverage_estimate": unit_execution.get("coverage", "N/A"),
+                "execution_time": "23s"
+            },
+            "overall_passed": unit_execution.get("passed", False)
+        }
+    
+    async def _scaffold_get(self, fingerprint: str) -> Optional[str]:
+        tests = TestingAgent._scaffolds.get(fingerprint)
+        if tests is not None:
+            TestingAgent._scaffolds.move_to_end(fingerprint)
+            return tests
+        bus = get_redis_bus()
+        if not bus.redis:
+            return None
+        try:
+            tests = await bus.redis.get("testscaffold:" + fingerprint)
+        except Exception as e:
+            logger.warning(f"Test scaffold cache read failed: {e}")
+            return None
+        if tests is not None:
+            self._scaffold_remember(fingerprint, tests)
+        return tests
+    
+    def _scaffold_remember(self, fingerprint: str, tests: str):
+        TestingAgent._scaffolds[fingerprint] = tests
+        TestingAgent._scaffolds.move_to_end(fingerprint)
+        while len(TestingAgent._scaffolds) > _SCAFFOLD_MAX:
+            TestingAgent._scaffolds.popitem(last=False)
+    
+    async def _scaffold_put(self, fingerprint: str, tests: str):
+        self._scaffold_remember(fingerprint, tests)
+        bus = get_redis_bus()
+        if not bus.redis:
+            return
+        try:
+            await bus.redis.set("testscaffold:" + fingerprint, tests, ex=_SCAFFOLD_TTL)
+        except Exception as e:
+            logger.warning(f"Test scaffold cache write failed: {e}")
+    
+    async def _gen_unit_tests(self, backend_slice: str, fingerprint: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        """Generate pytest unit tests; returns (code, error) with fallback code on error"""
+        if fingerprint is not None:
+            cached = await self._scaffold_get(fingerprint)
+            if cached is not None:
+                return cached, None
+        # Static instructions first, code last: the shared prefix is cacheable provider-side
+        unit_test_prompt = f"""{_unit_instructions(backend_slice)}
+
+API CODE:
+{backend_slice}"""
+        try:
+            unit_resp = await self.generate_response(unit_test_prompt)
+            unit_tests = _FENCE_RE.sub("", unit_resp).strip()
+            
+            # Add necessary imports if missing
+            if "import pytest" not in unit_tests:
+                unit_tests = "import pytest\nfrom fastapi.testclient import TestClient\n\n" + unit_tests
+            if fingerprint is not None and not self._is_fallback(unit_resp):
+                await self._scaffold_put(fingerprint, unit_tests)
+            return unit_tests, None
+        except Exception as e:
+            print(f"❌ Unit test generation error: {e}")
+            return self._generate_fallback_unit_tests(backend_slice), str(e)
+    
+    async def _gen_e2e_tests(self, frontend_slice: str, backend_slice: str) -> Tuple[str, Optional[str]]:
+        """Generate Playwright E2E tests; returns (code, error) with fallback code on error"""
+        e2e_prompt = f"""{_e2e_instructions(frontend_slice)}
+
+Frontend: {frontend_slice}
+Backend API: {backend_slice}"""
+        try:
+            e2e_resp = await self.generate_response(e2e_prompt)
+            e2e_tests = _FENCE_RE.sub("", e2e_resp).strip()
+            
+            if "from playwright" not in e2e_tests:
+                e2e_tests = "from playwright.sync_api import Page, expect\nimport pytest\n\n" + e2e_tests
+            return e2e_tests, None
+        except Exception as e:
+            print(f"❌ E2E test generation error: {e}")
+            return self._generate_fallback_e2e_tests(frontend_slice), str(e)
+    
+    async def _execute_pytest(self, backend_code: str, test_code: str) -> Dict[str, Any]:
+        """Execute pytest in isolated environment"""
+        try:
+            # ignore_cleanup_errors: a killed run must not leave the task failing on rmtree
+            with tempfile.TemporaryDirectory(dir=self._sandbox_dir, prefix="devo_", ignore_cleanup_errors=True) as tmpdir:
+                _write_file(os.path.join(tmpdir, "main.py"), backend_code)
+                test_file = os.path.join(tmpdir, "test_main.py")
+                _write_file(test_file, test_code)
+                
+                report_file = os.path.join(tmpdir, "report.json")
+                pytest_args = [
+                    test_file, "-v", "--tb=short", "--timeout=10",
+                    # Summary-only structured report: counts come from a dict, not from scraping stdout
+                    "--json-report", f"--json-report-file={report_file}", "--json-report-summary"
+                ]
+                if _PYTEST_WORKERS > 1:
+                    # --dist=load: the suite is one file, so loadfile would put every test on one worker
+                    pytest_args += ["-n", str(_PYTEST_WORKERS), "--dist=load"]
+                runner = get_pytest_runner()
+                if runner is not None:
+                    # Warm path: forked from a worker with pytest pre-imported, no interpreter/plugin startup per run
+                    exit_code, output, timed_out = await asyncio.to_thread(
+                        runner.run, tmpdir, pytest_args, _PYTEST_TIMEOUT
+                    )
+                    if timed_out:
+                        raise asyncio.TimeoutError
+                else:
+                    output_file = os.path.join(tmpdir, "output.txt")
+                    with open(output_file, "wb") as out:
+                        proc = await asyncio.create_subprocess_exec(
+                            sys.executable, "-m", "pytest", *pytest_args,
+                            cwd=tmpdir,
+                            stdout=out,
+                            stderr=asyncio.subprocess.STDOUT
+                        )
+                        try:
+                            exit_code = await asyncio.wait_for(proc.wait(), timeout=_PYTEST_TIMEOUT)
+                        except asyncio.TimeoutError:
+                            proc.kill()
+                            await proc.wait()
+                            raise
+                    with open(output_file, errors="replace") as f:
+                        output = f.read(_OUTPUT_HEAD)
+                
+                try:
+                    with open(report_file) as f:
+                        summary = _loads(f.read()).get("summary", {})
+                except (OSError, ValueError):
+                    summary = {}  # collection crashed before the report was written
+                
+                return {
+                    "passed": exit_code == 0,
+                    "total_tests": summary.get("total", 0),
+                    "tests_passed": summary.get("passed", 0),
+                    "tests_failed": summary.get("failed", 0) + summary.get("error", 0),
+                    "output": output[:_OUTPUT_HEAD],  # Truncate for display
+                    "exit_code": exit_code
+                }
+                
+        except asyncio.TimeoutError:
+            return {
+                "passed": False,
+                "error": f"Test execution timeout (>{_PYTEST_TIMEOUT}s)",
+                "total_tests": 0
+            }
+        except Exception as e:
+            return {
+                "passed": False,
+                "error": f"Execution failed: {str(e)}",
+                "total_tests": 0
+            }
+    
+    def _count_test_functions(self, code: str) -> int:
+        """Count test functions in code"""
+        return sum(1 for _ in _TEST_FN_RE.finditer(code))
+    
+    def _generate_fallback_unit_tests(self, backend_code: str) -> str:
+        """Generate basic fallback tests"""
+        return _FALLBACK_UNIT_TESTS
+    
+    def _generate_fallback_e2e_tests(self, frontend_code: str) -> str:
+        """Generate basic fallback E2E tests"""
+        return _FALLBACK_E2E_TESTS
\ No newline at end of file
@@ -1,8 +1,9 @@
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from pydantic import BaseModel
-import os, sys, json
+import os, sys, json, time
+import asyncio
 from datetime import datetime
 from dotenv import load_dotenv
 from typing import Optional
@@ -20,11 +21,20 @@ logger = logging.getLogger(__name__)
 
 # Imports
 from agents.orchestrator import OrchestratorAgent
+from agents.base_agent import _dumps, _loads
 from database import get_db_manager
 from core.redis_manager import get_redis_bus
+from core.pytest_runner import sweep_stale_sandboxes
+
+# orjson-backed responses when available (same fallback rule as agents.base_agent)
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as _DefaultResponse
+except ImportError:
+    _DefaultResponse = JSONResponse
 
 # Initialize
-app = FastAPI(title="DevOrchestra v2.0")
+app = FastAPI(title="DevOrchestra v2.0", default_response_class=_DefaultResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,15 +47,49 @@ orchestrator = OrchestratorAgent()
 db = get_db_manager()
 redis_bus = get_redis_bus()
 
+_SWEEP_INTERVAL = 600
+_SANDBOX_MAX_AGE = 3600
+
+async def _sweep_sandboxes():
+    """Periodically remove sandbox dirs leaked by killed pytest runs"""
+    while True:
+        try:
+            removed = await asyncio.to_thread(sweep_stale_sandboxes, _SANDBOX_MAX_AGE)
+            if removed:
+                logger.info(f"🧹 Removed {removed} stale sandbox dirs")
+        except Exception as e:
+            logger.warning(f"Sandbox sweep failed: {e}")
+        await asyncio.sleep(_SWEEP_INTERVAL)
+
+@app.on_event("startup")
+async def start_sandbox_sweeper():
+    app.state.sandbox_sweeper = asyncio.create_task(_sweep_sandboxes())
+
+@app.on_event("shutdown")
+async def flush_pending_writes():
+    orchestrator.stop_ws_flusher()
+    await orchestrator.drain_db_writes()
+    db.close()
+
 class UserStoryRequest(BaseModel):
     user_story: str
     project_name: str = "demo"
 
 # --- DASHBOARD HTML ---
+_DASHBOARD_PATH = os.path.join(CURRENT_DIR, 'index.html')
+
+def _read_dashboard() -> bytes:
+    with open(_DASHBOARD_PATH, 'rb') as f:
+        return f.read()
+
+# Read once at import; DEV=true re-reads per request so edits show up without a restart
+_DASHBOARD_HTML = _read_dashboard()
+
 @app.get("/", response_class=HTMLResponse)
 async def serve_dashboard():
-    with open(os.path.join(os.path.dirname(__file__), 'index.html'), 'r') as f:
-        return f.read()
+    if os.getenv("DEV", "false").lower() == "true":
+        return HTMLResponse(content=_read_dashboard())
+    return HTMLResponse(content=_DASHBOARD_HTML)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -58,21 +102,16 @@ async def websocket_endpoint(websocket: WebSocket):
             user_story = data.get("user_story") or data.get("message", "")
             
             if not user_story:
-                await websocket.send_json({"type": "error", "message": "No user story provided"})
+                await websocket.send_text(_dumps({"type": "error", "message": "No user story provided"}))
                 continue
             
             logger.info(f"📝 Received: {user_story[:50]}...")
             
-            # Set websocket for orchestrator
-            orchestrator.set_websocket(websocket)
+            # Set websocket for orchestrator; msgpack batches only if the client asked for them
+            orchestrator.set_websocket(websocket, binary_frames=websocket.query_params.get("frames") == "msgpack")
             
-            # Initial progress
-            await websocket.send_json({
-                "type": "progress",
-                "progress": 5,
-                "message": "🚀 Starting orchestration...",
-                "agent": "orchestrator"
-            })
+            # Initial progress: queued with the orchestrator's own updates so it rides the first batch frame
+            await orchestrator.send_progress(5, "🚀 Starting orchestration...")
             
             try:
                 # RUN ORCHESTRATOR
@@ -84,10 +123,10 @@ async def websocket_endpoint(websocket: WebSocket):
                 
             except Exception as e:
                 logger.error(f"❌ Orchestration error: {e}")
-                await websocket.send_json({
+                await websocket.send_text(_dumps({
                     "type": "error",
                     "message": str(e)
-                })
+                }))
     
     except WebSocketDisconnect:
         logger.info("🔌 WebSocket disconnected")
@@ -97,38 +136,39 @@ async def get_status():
     """Get all agent statuses"""
     metrics_data = orchestrator.get_all_metrics()
     metrics_data["system"] = {
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": orchestrator.now_iso(),
         "redis_connected": redis_bus.health_check() if redis_bus else False
     }
     return metrics_data
 
+# (monotonic timestamp, payload); the dashboard polls this, the 7-day aggregate barely moves
+_PERF_TTL = 30
+_perf_cache = (0.0, None)
+
 @app.get("/metrics/performance")
 async def get_performance_metrics():
     """Get performance metrics from database"""
+    global _perf_cache
+    cached_at, cached = _perf_cache
+    if cached is not None and time.monotonic() - cached_at < _PERF_TTL:
+        return cached
     try:
-        cursor = db.conn.execute("""
-            SELECT 
-                COUNT(*) as total_tasks,
-                SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as successful,
-                AVG(CASE WHEN status = 'completed' THEN 
-                    (julianday('now') - julianday(timestamp)) * 86400 
-                END) as avg_time_seconds
-            FROM tasks
-            WHERE timestamp > datetime('now', '-7 days')
-        """)
-        row = cursor.fetchone()
+        # sqlite calls block, so they run on a worker thread to keep the event loop free
+        row = await asyncio.to_thread(db.get_performance_summary)
         
         if row:
             total, successful, avg_time = row
             success_rate = (successful / total * 100) if total > 0 else 0
             speedup = (4 * 3600 / avg_time) if avg_time and avg_time > 0 else 0
             
-            return {
+            payload = {
                 "total_tasks_7d": total or 0,
                 "success_rate": f"{success_rate:.1f}%",
                 "avg_execution_time": f"{avg_time:.1f}s" if avg_time else "N/A",
                 "estimated_speedup": f"{speedup:.1f}x" if speedup > 0 else "N/A"
             }
+            _perf_cache = (time.monotonic(), payload)
+            return payload
     except Exception as e:
         logger.error(f"Metrics error: {e}")
     
@@ -143,15 +183,12 @@ async def get_performance_metrics():
 async def get_latest_task():
     """Get most recent task with proper code extraction"""
     try:
-        cursor = db.conn.execute(
-            "SELECT id, status, result, timestamp FROM tasks ORDER BY timestamp DESC LIMIT 1"
-        )
-        row = cursor.fetchone()
+        row = await asyncio.to_thread(db.get_latest_task)
         
         if not row:
             raise HTTPException(status_code=404, detail="No tasks found")
         
-        task_id, status, result_json, timestamp = row
+        task_id, _, status, result_json, timestamp = row
         
         # Default empty results
         results = {
@@ -162,7 +199,7 @@ async def get_latest_task():
         
         if result_json:
             try:
-                parsed = json.loads(result_json)
+                parsed = _loads(result_json)
                 gen_code = parsed.get("generated_code", {})
                 
                 # ✅ FIXED: Proper extraction logic
@@ -207,6 +244,14 @@ async def get_latest_task():
         logger.error(f"❌ Error fetching latest task: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/tasks/{task_id}/diff")
+async def get_legacy_diff(task_id: str):
+    """Unified diff for a legacy integration task, computed on request"""
+    diff = await orchestrator.legacy_agent.load_diff(task_id)
+    if diff is None:
+        raise HTTPException(status_code=404, detail="Diff not found or expired")
+    return {"task_id": task_id, "diff": diff}
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
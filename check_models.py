@@ -9,22 +9,30 @@ import google.generativeai as genai
 from core.redis_manager import get_redis_bus
 from datetime import datetime
 
+# One configured client/model per process, shared by every agent
+_MODEL = None
+
+def _get_model():
+    global _MODEL
+    if _MODEL is None:
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            return None
+        genai.configure(api_key=api_key)
+        # 👇 FIXED: Using a model that actually exists in your list!
+        _MODEL = genai.GenerativeModel('gemini-pro')
+    return _MODEL
+
 class BaseAgent(ABC):
     def __init__(self, agent_id: str):
         self.agent_id = agent_id
         self.redis_bus = get_redis_bus()
         self.logger = logging.getLogger(agent_id)
         
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if api_key:
-            try:
-                genai.configure(api_key=api_key)
-                # 👇 FIXED: Using a model that actually exists in your list!
-                self.model = genai.GenerativeModel('gemini-pro')
-            except Exception as e:
-                self.logger.error(f"Failed to configure AI model: {e}")
-                self.model = None
-        else:
+        try:
+            self.model = _get_model()
+        except Exception as e:
+            self.logger.error(f"Failed to configure AI model: {e}")
             self.model = None
 
     @abstractmethod
@@ -45,13 +53,7 @@ class BaseAgent(ABC):
             raise
 
     async def _publish_status(self, task_id: str, agent_id: str, status: str, data: Dict = None):
-        if not data: data = {}
-        await self.redis_bus.publish_task_status(task_id, agent_id, status, data)
-        message = {
-            "task_id": task_id, "agent_id": agent_id, "status": status,
-            "data": data, "timestamp": datetime.now().isoformat()
-        }
-        await self.redis_bus.store_task_history(task_id, message)
+        await self.redis_bus.publish_and_store(task_id, agent_id, status, data)
 
     def get_metrics(self) -> Dict[str, Any]:
         return {
@@ -3,18 +3,237 @@ Metrics Collector - Real-time performance tracking
 Collects: Execution times, quality scores, speedup metrics, success rates
 """
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Dict, Any, List
 import json
-import statistics
+import logging
+import atexit
+import time
+import pathlib
+import queue
+import threading
+from contextlib import contextmanager
+
+# Faster JSON for exports when orjson is available
+try:
+    import orjson
+
+    def _json_bytes(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    def _json_bytes(obj) -> bytes:
+        return json.dumps(obj, indent=2).encode()
+from core.sqlite_utils import tune_connection, checkpoint_and_close, is_file_db
+
+class _ConnectionPool:
+    """One writer (serialized by a lock, BEGIN IMMEDIATE) plus up to N read-only readers.
+    In WAL mode readers see the last committed state and never wait on the writer."""
+    def __init__(self, db_path: str, readers: int = 8):
+        self.db_path = db_path
+        # Autocommit mode: transactions are explicit so the writer can take the lock up front
+        self.writer_conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        tune_connection(self.writer_conn, db_path)
+        self._write_lock = threading.Lock()
+        self._max_readers = readers if is_file_db(db_path) else 0
+        self._readers = queue.Queue()
+        self._opened = 0
+        self._open_lock = threading.Lock()
+    
+    @contextmanager
+    def writer(self):
+        with self._write_lock:
+            self.writer_conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.writer_conn
+            except BaseException:
+                self.writer_conn.execute("ROLLBACK")
+                raise
+            else:
+                self.writer_conn.execute("COMMIT")
+    
+    def _open_reader(self) -> sqlite3.Connection:
+        uri = pathlib.Path(self.db_path).absolute().as_uri() + "?mode=ro"
+        # Pooled connections move between threads (one user at a time), hence check_same_thread=False
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        tune_connection(conn, self.db_path)
+        return conn
+    
+    @contextmanager
+    def reader(self):
+        if not self._max_readers:
+            # In-memory databases can't be opened twice; reads share the writer
+            with self._write_lock:
+                yield self.writer_conn
+            return
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._open_lock:
+                can_open = self._opened < self._max_readers
+                if can_open:
+                    self._opened += 1
+            conn = self._open_reader() if can_open else self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+    
+    def close_readers(self):
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                return
+
+_INSERT_SQL = {
+    "execution": """
+        INSERT INTO execution_metrics (task_id, agent_name, execution_time, success, quality_score)
+        VALUES (?, ?, ?, ?, ?)
+    """,
+    "quality": """
+        INSERT INTO quality_metrics 
+        (task_id, agent_type, language, quality_score, passed_threshold, linting_results, sonarqube_metrics)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """,
+    "speedup": """
+        INSERT INTO speedup_metrics 
+        (task_id, total_execution_time, manual_estimate_hours, speedup_factor, agents_used)
+        VALUES (?, ?, ?, ?, ?)
+    """,
+}
+# Explicit adapter (the implicit default one is deprecated); same text shape as CURRENT_TIMESTAMP
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" ", "seconds"))
+
+@lru_cache(maxsize=32)
+def _cutoff_for_minute(days: int, minute: int) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+def _cutoff_iso(days: int) -> str:
+    """UTC cutoff as text comparable with CURRENT_TIMESTAMP columns; recomputed at most once a minute"""
+    return _cutoff_for_minute(days, int(time.time() // 60))
+
+_SPEEDUP_HISTORY_SQL = """
+    SELECT 
+        task_id,
+        total_execution_time,
+        manual_estimate_hours,
+        speedup_factor,
+        agents_used,
+        timestamp
+    FROM speedup_metrics
+    ORDER BY timestamp DESC
+    LIMIT ?
+"""
+
+def _speedup_entry(row) -> Dict[str, Any]:
+    task_id, exec_time, manual_hours, speedup, agents, timestamp = row
+    return {
+        "task_id": task_id,
+        "execution_time_seconds": round(exec_time, 2),
+        "manual_estimate_hours": manual_hours,
+        "speedup_factor": round(speedup, 2),
+        "agents_used": agents,
+        "timestamp": timestamp,
+        "time_saved_hours": round(manual_hours - (exec_time / 3600), 2)
+    }
+
+logger = logging.getLogger("metrics")
+
+# Errors that mean "this row can't be stored" rather than "the database is unavailable"
+_BAD_ROW_ERRORS = (sqlite3.InterfaceError, sqlite3.ProgrammingError, sqlite3.IntegrityError,
+                   sqlite3.DataError, ValueError, TypeError, OverflowError)
+
+_FLUSH_ROWS = 32
+_FLUSH_INTERVAL = 0.5  # seconds
 
 class MetricsCollector:
     def __init__(self, db_path="metrics.db"):
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.db_path = db_path
+        self._pool = _ConnectionPool(db_path)
+        self.conn = self._pool.writer_conn
         self._create_tables()
+        
+        # log_* rows are buffered and written with executemany: one commit per batch, not per event
+        self._pending = {kind: [] for kind in _INSERT_SQL}
+        self._pending_count = 0
+        self._pending_lock = threading.Lock()
+        # Held from buffer swap to commit, so a reader's flush() returns only once earlier rows are visible
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._closed = False
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+    
+    def close(self):
+        """Flush buffered rows, checkpoint the WAL and close (call on shutdown)"""
+        self._stop.set()
+        self._flusher.join(timeout=5)
+        self.flush()
+        self._closed = True
+        self._pool.close_readers()
+        checkpoint_and_close(self.conn, self.db_path)
+    
+    def _flush_loop(self):
+        while not self._stop.wait(_FLUSH_INTERVAL):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Metrics flush failed: {e}")
+    
+    def _buffer(self, kind: str, row: tuple):
+        with self._pending_lock:
+            self._pending[kind].append(row)
+            self._pending_count += 1
+            due = (self._pending_count >= _FLUSH_ROWS
+                   or time.monotonic() - self._last_flush > _FLUSH_INTERVAL)
+        if due:
+            self.flush()
+    
+    def flush(self):
+        """Write all buffered rows in a single transaction"""
+        with self._flush_lock:
+            with self._pending_lock:
+                if not self._pending_count or self._closed:
+                    return
+                batches, self._pending = self._pending, {kind: [] for kind in _INSERT_SQL}
+                self._pending_count = 0
+                self._last_flush = time.monotonic()
+            try:
+                self._write_batches(batches)
+            except Exception as e:
+                # Database unavailable: keep the rows (ahead of newer ones) for the next flush
+                logger.error(f"Metrics write failed, will retry: {e}")
+                with self._pending_lock:
+                    for kind, rows in batches.items():
+                        self._pending[kind][:0] = rows
+                        self._pending_count += len(rows)
+    
+    def _write_batches(self, batches: Dict[str, List[tuple]]):
+        try:
+            with self._pool.writer() as conn:
+                for kind, rows in batches.items():
+                    if rows:
+                        conn.executemany(_INSERT_SQL[kind], rows)
+            return
+        except _BAD_ROW_ERRORS as e:
+            logger.warning(f"Batched metrics insert failed ({e}); retrying row by row")
+        # One bad row must not take the rest of the batch with it: drop only the rows that fail
+        with self._pool.writer() as conn:
+            for kind, rows in batches.items():
+                for row in rows:
+                    try:
+                        conn.execute(_INSERT_SQL[kind], row)
+                    except _BAD_ROW_ERRORS as e:
+                        logger.error(f"Dropping invalid {kind} metrics row {row!r}: {e}")
     
     def _create_tables(self):
         """Create metrics tables."""
+        has_rollups = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'agent_rollup'"
+        ).fetchone() is not None
         self.conn.executescript("""
             CREATE TABLE IF NOT EXISTS execution_metrics (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -35,7 +254,8 @@ class MetricsCollector:
                 passed_threshold BOOLEAN,
                 linting_results TEXT,
                 sonarqube_metrics TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                day_bucket DATE GENERATED ALWAYS AS (date(timestamp)) VIRTUAL
             );
             
             CREATE TABLE IF NOT EXISTS speedup_metrics (
@@ -57,93 +277,185 @@ class MetricsCollector:
                 last_updated DATETIME DEFAULT CURRENT_TIMESTAMP
             );
             
-            CREATE INDEX IF NOT EXISTS idx_task_timestamp ON execution_metrics(timestamp);
             CREATE INDEX IF NOT EXISTS idx_agent_name ON execution_metrics(agent_name);
+            
+            -- Covering indexes: dashboard aggregates read only the index B-tree, no rowid lookups
+            DROP INDEX IF EXISTS idx_task_timestamp;
+            CREATE INDEX IF NOT EXISTS idx_em_ts_cover
+                ON execution_metrics(timestamp, agent_name, success, execution_time, quality_score);
+            CREATE INDEX IF NOT EXISTS idx_qm_ts_cover
+                ON quality_metrics(timestamp, agent_type, quality_score, passed_threshold);
+            CREATE INDEX IF NOT EXISTS idx_sm_ts_cover
+                ON speedup_metrics(timestamp, speedup_factor, total_execution_time);
+            
+            -- Per-agent, per-day running aggregates maintained at INSERT time, so dashboard
+            -- reads are O(agents x days) instead of a scan over every logged event
+            CREATE TABLE IF NOT EXISTS agent_rollup (
+                agent_name TEXT,
+                day DATE,
+                total INTEGER NOT NULL DEFAULT 0,
+                successful INTEGER NOT NULL DEFAULT 0,
+                sum_exec REAL NOT NULL DEFAULT 0,
+                n_exec INTEGER NOT NULL DEFAULT 0,
+                min_exec REAL,
+                max_exec REAL,
+                sum_quality REAL NOT NULL DEFAULT 0,
+                n_quality INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (agent_name, day)
+            );
+            
+            CREATE TABLE IF NOT EXISTS speedup_rollup (
+                day DATE PRIMARY KEY,
+                n INTEGER NOT NULL DEFAULT 0,
+                sum_speedup REAL NOT NULL DEFAULT 0,
+                min_speedup REAL,
+                max_speedup REAL,
+                sum_total_time REAL NOT NULL DEFAULT 0,
+                n_total_time INTEGER NOT NULL DEFAULT 0
+            );
+            
+            -- Scalar MIN/MAX return NULL if either side is NULL, hence the COALESCE fallbacks
+            CREATE TRIGGER IF NOT EXISTS trg_execution_rollup AFTER INSERT ON execution_metrics
+            BEGIN
+                INSERT INTO agent_rollup
+                    (agent_name, day, total, successful, sum_exec, n_exec, min_exec, max_exec, sum_quality, n_quality)
+                VALUES (
+                    NEW.agent_name, date(NEW.timestamp), 1, COALESCE(NEW.success, 0),
+                    COALESCE(NEW.execution_time, 0), NEW.execution_time IS NOT NULL,
+                    NEW.execution_time, NEW.execution_time,
+                    COALESCE(NEW.quality_score, 0), NEW.quality_score IS NOT NULL
+                )
+                ON CONFLICT(agent_name, day) DO UPDATE SET
+                    total = total + 1,
+                    successful = successful + excluded.successful,
+                    sum_exec = sum_exec + excluded.sum_exec,
+                    n_exec = n_exec + excluded.n_exec,
+                    min_exec = COALESCE(MIN(min_exec, excluded.min_exec), min_exec, excluded.min_exec),
+                    max_exec = COALESCE(MAX(max_exec, excluded.max_exec), max_exec, excluded.max_exec),
+                    sum_quality = sum_quality + excluded.sum_quality,
+                    n_quality = n_quality + excluded.n_quality;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS trg_speedup_rollup AFTER INSERT ON speedup_metrics
+            BEGIN
+                INSERT INTO speedup_rollup (day, n, sum_speedup, min_speedup, max_speedup, sum_total_time, n_total_time)
+                VALUES (
+                    date(NEW.timestamp), NEW.speedup_factor IS NOT NULL, COALESCE(NEW.speedup_factor, 0),
+                    NEW.speedup_factor, NEW.speedup_factor,
+                    COALESCE(NEW.total_execution_time, 0), NEW.total_execution_time IS NOT NULL
+                )
+                ON CONFLICT(day) DO UPDATE SET
+                    n = n + excluded.n,
+                    sum_speedup = sum_speedup + excluded.sum_speedup,
+                    min_speedup = COALESCE(MIN(min_speedup, excluded.min_speedup), min_speedup, excluded.min_speedup),
+                    max_speedup = COALESCE(MAX(max_speedup, excluded.max_speedup), max_speedup, excluded.max_speedup),
+                    sum_total_time = sum_total_time + excluded.sum_total_time,
+                    n_total_time = n_total_time + excluded.n_total_time;
+            END;
+            
+            -- Planner statistics; analysis_limit keeps startup cost bounded on large tables
+            PRAGMA analysis_limit=1000;
+            ANALYZE;
         """)
+        # Databases created before day_bucket existed: only VIRTUAL generated columns can be ALTERed in,
+        # and the index below materializes the value anyway
+        qm_columns = {row[1] for row in self.conn.execute("PRAGMA table_xinfo(quality_metrics)")}
+        if "day_bucket" not in qm_columns:
+            self.conn.execute(
+                "ALTER TABLE quality_metrics ADD COLUMN day_bucket DATE GENERATED ALWAYS AS (date(timestamp)) VIRTUAL"
+            )
+        # Trends group by (day, agent) straight off this index: no per-row date() call, no sort
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_qm_day_agent ON quality_metrics(day_bucket, agent_type, quality_score)"
+        )
+        if not has_rollups:
+            # First run with rollups on an existing database: seed them from the raw events
+            self.conn.executescript("""
+                INSERT INTO agent_rollup
+                    (agent_name, day, total, successful, sum_exec, n_exec, min_exec, max_exec, sum_quality, n_quality)
+                SELECT agent_name, date(timestamp), COUNT(*), COALESCE(SUM(success), 0),
+                       COALESCE(SUM(execution_time), 0), COUNT(execution_time),
+                       MIN(execution_time), MAX(execution_time),
+                       COALESCE(SUM(quality_score), 0), COUNT(quality_score)
+                FROM execution_metrics
+                GROUP BY agent_name, date(timestamp);
+                
+                INSERT INTO speedup_rollup (day, n, sum_speedup, min_speedup, max_speedup, sum_total_time, n_total_time)
+                SELECT date(timestamp), COUNT(speedup_factor), COALESCE(SUM(speedup_factor), 0),
+                       MIN(speedup_factor), MAX(speedup_factor),
+                       COALESCE(SUM(total_execution_time), 0), COUNT(total_execution_time)
+                FROM speedup_metrics
+                GROUP BY date(timestamp);
+            """)
         self.conn.commit()
     
     def log_execution(self, task_id: str, agent_name: str, execution_time: float, 
                      success: bool, quality_score: int = None):
         """Log agent execution metrics."""
-        self.conn.execute("""
-            INSERT INTO execution_metrics (task_id, agent_name, execution_time, success, quality_score)
-            VALUES (?, ?, ?, ?, ?)
-        """, (task_id, agent_name, execution_time, success, quality_score))
-        self.conn.commit()
+        self._buffer("execution", (task_id, agent_name, execution_time, success, quality_score))
     
     def log_quality(self, task_id: str, agent_type: str, language: str, 
                    quality_score: int, passed_threshold: bool, 
                    linting_results: Dict, sonarqube_metrics: Dict):
         """Log code quality metrics."""
-        self.conn.execute("""
-            INSERT INTO quality_metrics 
-            (task_id, agent_type, language, quality_score, passed_threshold, linting_results, sonarqube_metrics)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
+        self._buffer("quality", (
             task_id, agent_type, language, quality_score, passed_threshold,
             json.dumps(linting_results), json.dumps(sonarqube_metrics)
         ))
-        self.conn.commit()
     
     def log_speedup(self, task_id: str, total_execution_time: float, 
                    manual_estimate_hours: float, agents_used: int):
         """Log speedup metrics."""
         speedup_factor = (manual_estimate_hours * 3600) / total_execution_time if total_execution_time > 0 else 0
         
-        self.conn.execute("""
-            INSERT INTO speedup_metrics 
-            (task_id, total_execution_time, manual_estimate_hours, speedup_factor, agents_used)
-            VALUES (?, ?, ?, ?, ?)
-        """, (task_id, total_execution_time, manual_estimate_hours, speedup_factor, agents_used))
-        self.conn.commit()
+        self._buffer("speedup", (task_id, total_execution_time, manual_estimate_hours, speedup_factor, agents_used))
     
     def get_performance_summary(self, days: int = 7) -> Dict[str, Any]:
         """Get performance summary for the last N days."""
-        cutoff_date = datetime.now() - timedelta(days=days)
-        
-        # Overall metrics
-        cursor = self.conn.execute("""
-            SELECT 
-                COUNT(*) as total_tasks,
-                SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successful_tasks,
-                AVG(execution_time) as avg_execution_time,
-                MIN(execution_time) as min_execution_time,
-                MAX(execution_time) as max_execution_time
-            FROM execution_metrics
-            WHERE timestamp > ?
-        """, (cutoff_date,))
+        self.flush()  # include rows still in the write buffer
+        cutoff_date = _cutoff_iso(days)
         
-        row = cursor.fetchone()
-        total, successful, avg_time, min_time, max_time = row if row else (0, 0, 0, 0, 0)
+        # One statement for all three tables: one prepare, one reader checkout, cutoff bound once per CTE
+        with self._pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            row = cursor.execute("""
+                WITH e AS (
+                    SELECT 
+                        COALESCE(SUM(total), 0) as total_tasks,
+                        COALESCE(SUM(successful), 0) as successful_tasks,
+                        SUM(sum_exec) / NULLIF(SUM(n_exec), 0) as avg_execution_time,
+                        MIN(min_exec) as min_execution_time,
+                        MAX(max_exec) as max_execution_time
+                    FROM agent_rollup
+                    WHERE day >= date(?)
+                ), sp AS (
+                    SELECT 
+                        SUM(sum_speedup) / NULLIF(SUM(n), 0) as avg_speedup,
+                        MIN(min_speedup) as min_speedup,
+                        MAX(max_speedup) as max_speedup,
+                        SUM(sum_total_time) / NULLIF(SUM(n_total_time), 0) as avg_total_time
+                    FROM speedup_rollup
+                    WHERE day >= date(?)
+                ), q AS (
+                    SELECT 
+                        AVG(quality_score) as avg_quality,
+                        SUM(CASE WHEN passed_threshold = 1 THEN 1 ELSE 0 END) as passed_count,
+                        COUNT(*) as total_quality_checks
+                    FROM quality_metrics
+                    WHERE timestamp > ?
+                )
+                SELECT * FROM e, sp, q
+            """, (cutoff_date, cutoff_date, cutoff_date)).fetchone()
         
+        total, successful = row["total_tasks"], row["successful_tasks"]
+        avg_time, min_time, max_time = row["avg_execution_time"], row["min_execution_time"], row["max_execution_time"]
         success_rate = (successful / total * 100) if total > 0 else 0
         
-        # Speedup metrics
-        cursor = self.conn.execute("""
-            SELECT 
-                AVG(speedup_factor) as avg_speedup,
-                MIN(speedup_factor) as min_speedup,
-                MAX(speedup_factor) as max_speedup,
-                AVG(total_execution_time) as avg_total_time
-            FROM speedup_metrics
-            WHERE timestamp > ?
-        """, (cutoff_date,))
+        avg_speedup, min_speedup, max_speedup = row["avg_speedup"], row["min_speedup"], row["max_speedup"]
+        avg_total_time = row["avg_total_time"]
         
-        speedup_row = cursor.fetchone()
-        avg_speedup, min_speedup, max_speedup, avg_total_time = speedup_row if speedup_row else (0, 0, 0, 0)
-        
-        # Quality metrics
-        cursor = self.conn.execute("""
-            SELECT 
-                AVG(quality_score) as avg_quality,
-                SUM(CASE WHEN passed_threshold = 1 THEN 1 ELSE 0 END) as passed_count,
-                COUNT(*) as total_quality_checks
-            FROM quality_metrics
-            WHERE timestamp > ?
-        """, (cutoff_date,))
-        
-        quality_row = cursor.fetchone()
-        avg_quality, passed_count, total_checks = quality_row if quality_row else (0, 0, 0)
+        avg_quality, passed_count, total_checks = row["avg_quality"], row["passed_count"], row["total_quality_checks"]
         
         quality_pass_rate = (passed_count / total_checks * 100) if total_checks > 0 else 0
         
@@ -174,23 +486,26 @@ class MetricsCollector:
     
     def get_agent_performance(self, days: int = 7) -> List[Dict[str, Any]]:
         """Get performance metrics per agent."""
-        cutoff_date = datetime.now() - timedelta(days=days)
+        self.flush()  # include rows still in the write buffer
+        cutoff_date = _cutoff_iso(days)
         
-        cursor = self.conn.execute("""
-            SELECT 
-                agent_name,
-                COUNT(*) as total_tasks,
-                SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successful_tasks,
-                AVG(execution_time) as avg_execution_time,
-                AVG(quality_score) as avg_quality_score
-            FROM execution_metrics
-            WHERE timestamp > ?
-            GROUP BY agent_name
-            ORDER BY total_tasks DESC
-        """, (cutoff_date,))
+        with self._pool.reader() as conn:
+            cursor = conn.execute("""
+                SELECT 
+                    agent_name,
+                    SUM(total) as total_tasks,
+                    SUM(successful) as successful_tasks,
+                    SUM(sum_exec) / NULLIF(SUM(n_exec), 0) as avg_execution_time,
+                    SUM(sum_quality) / NULLIF(SUM(n_quality), 0) as avg_quality_score
+                FROM agent_rollup
+                WHERE day >= date(?)
+                GROUP BY agent_name
+                ORDER BY total_tasks DESC
+            """, (cutoff_date,))
+            rows = cursor.fetchall()
         
         agents = []
-        for row in cursor.fetchall():
+        for row in rows:
             agent_name, total, successful, avg_time, avg_quality = row
             success_rate = (successful / total * 100) if total > 0 else 0
             
@@ -207,21 +522,24 @@ class MetricsCollector:
     
     def get_quality_trends(self, days: int = 7) -> Dict[str, List]:
         """Get quality score trends over time."""
-        cutoff_date = datetime.now() - timedelta(days=days)
+        self.flush()  # include rows still in the write buffer
+        cutoff_date = _cutoff_iso(days)
         
-        cursor = self.conn.execute("""
-            SELECT 
-                DATE(timestamp) as date,
-                agent_type,
-                AVG(quality_score) as avg_score
-            FROM quality_metrics
-            WHERE timestamp > ?
-            GROUP BY DATE(timestamp), agent_type
-            ORDER BY date DESC, agent_type
-        """, (cutoff_date,))
+        with self._pool.reader() as conn:
+            cursor = conn.execute("""
+                SELECT 
+                    day_bucket as date,
+                    agent_type,
+                    AVG(quality_score) as avg_score
+                FROM quality_metrics
+                WHERE day_bucket >= date(?)
+                GROUP BY day_bucket, agent_type
+                ORDER BY day_bucket DESC, agent_type
+            """, (cutoff_date,))
+            rows = cursor.fetchall()
         
         trends = {}
-        for row in cursor.fetchall():
+        for row in rows:
             date, agent_type, avg_score = row
             if agent_type not in trends:
                 trends[agent_type] = []
@@ -234,52 +552,53 @@ class MetricsCollector:
     
     def get_speedup_history(self, limit: int = 20) -> List[Dict[str, Any]]:
         """Get recent speedup history."""
-        cursor = self.conn.execute("""
-            SELECT 
-                task_id,
-                total_execution_time,
-                manual_estimate_hours,
-                speedup_factor,
-                agents_used,
-                timestamp
-            FROM speedup_metrics
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, (limit,))
-        
-        history = []
-        for row in cursor.fetchall():
-            task_id, exec_time, manual_hours, speedup, agents, timestamp = row
-            history.append({
-                "task_id": task_id,
-                "execution_time_seconds": round(exec_time, 2),
-                "manual_estimate_hours": manual_hours,
-                "speedup_factor": round(speedup, 2),
-                "agents_used": agents,
-                "timestamp": timestamp,
-                "time_saved_hours": round(manual_hours - (exec_time / 3600), 2)
-            })
+        self.flush()  # include rows still in the write buffer
+        with self._pool.reader() as conn:
+            cursor = conn.execute(_SPEEDUP_HISTORY_SQL, (limit,))
+            rows = cursor.fetchall()
         
-        return history
+        return [_speedup_entry(row) for row in rows]
     
     def get_comparison_report(self) -> Dict[str, Any]:
         """Generate comprehensive comparison report for demo/presentation."""
         summary = self.get_performance_summary(days=30)
         agent_perf = self.get_agent_performance(days=30)
-        speedup_history = self.get_speedup_history(limit=10)
+        speedup_history = self.get_speedup_history(limit=5)
+        cutoff_date = _cutoff_iso(30)
         
-        # Calculate aggregates
-        if speedup_history:
-            speedups = [h['speedup_factor'] for h in speedup_history]
-            time_saved = [h['time_saved_hours'] for h in speedup_history]
-            
-            avg_speedup = statistics.mean(speedups)
-            median_speedup = statistics.median(speedups)
-            total_time_saved = sum(time_saved)
-        else:
-            avg_speedup = 0
-            median_speedup = 0
-            total_time_saved = 0
+        # Mean/median/time saved over the 10 most recent runs plus the best agent, in one statement
+        with self._pool.reader() as conn:
+            avg_speedup, median_speedup, total_time_saved, best_agent = conn.execute("""
+                WITH recent AS (
+                    SELECT
+                        ROUND(speedup_factor, 2) AS speedup,
+                        ROUND(manual_estimate_hours - total_execution_time / 3600.0, 2) AS time_saved
+                    FROM speedup_metrics
+                    ORDER BY timestamp DESC
+                    LIMIT 10
+                ),
+                ranked AS (
+                    SELECT speedup,
+                           ROW_NUMBER() OVER (ORDER BY speedup) AS rn,
+                           COUNT(*) OVER () AS cnt
+                    FROM recent
+                )
+                SELECT
+                    (SELECT AVG(speedup) FROM recent),
+                    (SELECT AVG(speedup) FROM ranked WHERE rn IN ((cnt + 1) / 2, (cnt + 2) / 2)),
+                    (SELECT SUM(time_saved) FROM recent),
+                    (SELECT agent_name
+                     FROM agent_rollup
+                     WHERE day >= date(?)
+                     GROUP BY agent_name
+                     HAVING SUM(total) > 0
+                     ORDER BY ROUND(SUM(successful) * 100.0 / SUM(total), 2) DESC, SUM(total) DESC
+                     LIMIT 1)
+            """, (cutoff_date,)).fetchone()
+        
+        avg_speedup = avg_speedup or 0
+        median_speedup = median_speedup or 0
+        total_time_saved = total_time_saved or 0
         
         return {
             "report_date": datetime.now().isoformat(),
@@ -289,29 +608,62 @@ class MetricsCollector:
                 "median_speedup": f"{round(median_speedup, 1)}x",
                 "total_time_saved_hours": round(total_time_saved, 2),
                 "total_time_saved_days": round(total_time_saved / 24, 2),
-                "best_performing_agent": max(agent_perf, key=lambda x: x['success_rate_percentage'])['agent_name'] if agent_perf else "N/A",
+                "best_performing_agent": best_agent or "N/A",
                 "avg_quality_score": summary['quality']['avg_quality_score']
             },
             "agent_performance": agent_perf,
-            "recent_speedups": speedup_history[:5]  # Top 5
+            "recent_speedups": speedup_history  # Top 5
         }
     
     def export_to_json(self, filename: str = None):
-        """Export all metrics to JSON for external analysis."""
+        """Export all metrics to JSON for external analysis.
+        Row-backed sections are streamed from their cursors, so memory stays flat as history grows."""
         if not filename:
             filename = f"metrics_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         
-        data = {
-            "export_date": datetime.now().isoformat(),
-            "performance_summary": self.get_performance_summary(days=30),
-            "agent_performance": self.get_agent_performance(days=30),
-            "quality_trends": self.get_quality_trends(days=30),
-            "speedup_history": self.get_speedup_history(limit=50),
-            "comparison_report": self.get_comparison_report()
-        }
+        # Small aggregate sections first: the in-memory reader shares the writer lock, so nothing
+        # else may query while a cursor below is open
+        export_date = datetime.now().isoformat()
+        summary = self.get_performance_summary(days=30)
+        agent_perf = self.get_agent_performance(days=30)
+        comparison = self.get_comparison_report()
+        cutoff_date = _cutoff_iso(30)
         
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=2)
+        with open(filename, 'wb') as f:
+            f.write(b'{\n"export_date": ' + _json_bytes(export_date))
+            f.write(b',\n"performance_summary": ' + _json_bytes(summary))
+            f.write(b',\n"agent_performance": ' + _json_bytes(agent_perf))
+            
+            # Grouped by agent in SQL order, so each agent's list is written as its rows arrive
+            f.write(b',\n"quality_trends": {')
+            with self._pool.reader() as conn:
+                cursor = conn.execute("""
+                    SELECT day_bucket, agent_type, AVG(quality_score)
+                    FROM quality_metrics
+                    WHERE day_bucket >= date(?)
+                    GROUP BY day_bucket, agent_type
+                    ORDER BY agent_type, day_bucket DESC
+                """, (cutoff_date,))
+                current = None
+                for date, agent_type, avg_score in cursor:
+                    if agent_type != current:
+                        f.write((b'],' if current is not None else b'') + b'\n' + _json_bytes(agent_type) + b': [')
+                        current = agent_type
+                    else:
+                        f.write(b',')
+                    f.write(_json_bytes({"date": date, "avg_quality_score": round(avg_score, 2)}))
+                if current is not None:
+                    f.write(b']\n')
+            f.write(b'}')
+            
+            f.write(b',\n"speedup_history": [')
+            with self._pool.reader() as conn:
+                for i, row in enumerate(conn.execute(_SPEEDUP_HISTORY_SQL, (50,))):
+                    f.write((b',\n' if i else b'\n') + _json_bytes(_speedup_entry(row)))
+            f.write(b'\n]')
+            
+            f.write(b',\n"comparison_report": ' + _json_bytes(comparison))
+            f.write(b'\n}\n')
         
         return filename
 
@@ -0,0 +1,195 @@
+"""
+core/pytest_runner.py
+Warm pytest sandbox: one long-lived worker with pytest pre-imported that
+forks a fresh child per run, so each run skips interpreter + plugin startup.
+Protocol: one JSON request per stdin line, one JSON result per stdout line.
+"""
+import atexit
+import json
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import List, Optional, Tuple
+
+_OUTPUT_FILE = ".pytest_output"
+_OUTPUT_MAX = 4096  # callers only display the head of the log
+# Concurrent warm workers; parallel mode runs up to 4 feature pipelines at once
+_MAX_WORKERS = max(1, int(os.getenv("PYTEST_WARM_WORKERS", "4")))
+_runner = None
+
+# RAM-backed tmpfs where available: sandbox files never touch disk
+SANDBOX_PARENT = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+_SANDBOX_PREFIX = "devo_"
+_SWEEP_BATCH = 20
+_SWEEP_PAUSE = 0.05  # seconds between batches, so a big backlog doesn't spike I/O
+_live_sandboxes = set()
+
+def make_sandbox_root() -> str:
+    """Per-process sandbox root; removed at exit and never swept while this process lives"""
+    root = tempfile.mkdtemp(prefix=_SANDBOX_PREFIX + "sandbox_", dir=SANDBOX_PARENT)
+    _live_sandboxes.add(root)
+    atexit.register(shutil.rmtree, root, True)
+    return root
+
+def sweep_stale_sandboxes(max_age: float = 3600) -> int:
+    """Remove devo_* dirs older than max_age left by killed runs/processes. Blocking; returns count"""
+    cutoff = time.time() - max_age
+    stale = []
+    parents = {tempfile.gettempdir()}
+    if SANDBOX_PARENT:
+        parents.add(SANDBOX_PARENT)
+    # Live roots are never removed, but runs leaked inside them are
+    parents.update(_live_sandboxes)
+    for parent in parents:
+        try:
+            entries = list(os.scandir(parent))
+        except OSError:
+            continue
+        for entry in entries:
+            if not entry.name.startswith(_SANDBOX_PREFIX) or entry.path in _live_sandboxes:
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                    stale.append(entry.path)
+            except OSError:
+                continue
+    for i, path in enumerate(stale, 1):
+        shutil.rmtree(path, ignore_errors=True)
+        if i % _SWEEP_BATCH == 0:
+            time.sleep(_SWEEP_PAUSE)
+    return len(stale)
+
+def _run_forked(workdir: str, args: List[str], timeout: float) -> dict:
+    """Fork a child that runs pytest.main; the fork keeps sys.modules clean between runs"""
+    import pytest
+    out_path = os.path.join(workdir, _OUTPUT_FILE)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.chdir(workdir)
+            sys.path.insert(0, workdir)
+            fd = os.open(out_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+            os.dup2(fd, 1)
+            os.dup2(fd, 2)
+            code = pytest.main(args + ["-p", "no:cacheprovider"])
+            sys.stdout.flush()
+            os._exit(int(code))
+        except BaseException:
+            os._exit(3)
+    deadline = time.monotonic() + timeout
+    timed_out = False
+    while True:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            break
+        if time.monotonic() > deadline:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            timed_out = True
+            status = -1
+            break
+        time.sleep(0.005)
+    try:
+        with open(out_path, errors="replace") as f:
+            output = f.read(_OUTPUT_MAX)
+    except OSError:
+        output = ""
+    exit_code = os.waitstatus_to_exitcode(status) if status != -1 else -1
+    return {"exit_code": exit_code, "output": output, "timed_out": timed_out}
+
+def _serve():
+    """Worker loop: pre-import heavy modules once, then serve requests until stdin closes"""
+    import pytest  # noqa: F401
+    try:
+        import fastapi.testclient  # noqa: F401
+    except ImportError:
+        pass
+    for line in sys.stdin:
+        req = json.loads(line)
+        result = _run_forked(req["workdir"], req["args"], req["timeout"])
+        sys.stdout.write(json.dumps(result) + "\n")
+        sys.stdout.flush()
+
+class _Worker:
+    """One warm worker process; used by a single caller at a time"""
+    def __init__(self):
+        self._proc = subprocess.Popen(
+            [sys.executable, "-m", "core.pytest_runner"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1
+        )
+
+    def alive(self) -> bool:
+        return self._proc.poll() is None
+
+    def run(self, workdir: str, args: List[str], timeout: float) -> dict:
+        self._proc.stdin.write(json.dumps({"workdir": workdir, "args": args, "timeout": timeout}) + "\n")
+        self._proc.stdin.flush()
+        line = self._proc.stdout.readline()
+        if not line:
+            raise RuntimeError("pytest worker exited")
+        return json.loads(line)
+
+    def close(self):
+        if self.alive():
+            self._proc.stdin.close()
+            self._proc.wait(timeout=5)
+
+class WarmPytestRunner:
+    """Pool of warm workers, started on demand up to max_workers; concurrent runs get separate
+    workers and only queue once all are busy. Calls are blocking: run them via asyncio.to_thread"""
+    def __init__(self, max_workers: int = 4):
+        self._idle = queue.LifoQueue()  # most recently used first: its page cache is warmest
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _checkout(self) -> _Worker:
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                worker = _Worker()
+                with self._lock:
+                    self._all.append(worker)
+                return worker
+            if worker.alive():
+                return worker
+
+    def run(self, workdir: str, args: List[str], timeout: float) -> Tuple[int, str, bool]:
+        """Returns (exit_code, output, timed_out)"""
+        with self._slots:
+            worker = self._checkout()
+            try:
+                result = worker.run(workdir, args, timeout)
+            except BaseException:
+                worker.close()
+                raise
+            self._idle.put(worker)
+        return result["exit_code"], result["output"], result["timed_out"]
+
+    def close(self):
+        with self._lock:
+            workers, self._all = self._all, []
+        for worker in workers:
+            worker.close()
+
+def get_pytest_runner() -> Optional[WarmPytestRunner]:
+    """Shared warm runner; None on platforms without os.fork"""
+    global _runner
+    if _runner is None and hasattr(os, "fork"):
+        _runner = WarmPytestRunner(_MAX_WORKERS)
+        atexit.register(_runner.close)
+    return _runner
+
+if __name__ == "__main__":
+    _serve()
@@ -0,0 +1,53 @@
+"""
+core/rate_limiter.py
+Async token bucket for provider request budgets.
+"""
+import asyncio
+import weakref
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+class PerLoop(Generic[T]):
+    """Lazily builds one asyncio primitive per running event loop.
+    Locks/semaphores bind to the first loop that contends them, so a shared import-time
+    instance breaks every later loop (a second asyncio.run, test runners, worker threads)."""
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._by_loop = weakref.WeakKeyDictionary()
+
+    def get(self) -> T:
+        loop = asyncio.get_running_loop()
+        obj = self._by_loop.get(loop)
+        if obj is None:
+            obj = self._by_loop[loop] = self._factory()
+        return obj
+
+class AsyncTokenBucket:
+    """Allows bursts up to `burst`, refills at `rate_per_sec`; only blocks when the budget is spent"""
+    def __init__(self, rate_per_sec: float, burst: float):
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self.tokens = burst
+        self.last_refill = None  # set on first use, in the event loop's clock
+        self._lock = PerLoop(asyncio.Lock)
+
+    def _refill(self):
+        # loop.time() is monotonic and the same clock asyncio.sleep uses
+        now = asyncio.get_running_loop().time()
+        if self.last_refill is None:
+            self.last_refill = now
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate_per_sec)
+        self.last_refill = now
+
+    async def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns seconds waited."""
+        async with self._lock.get():
+            self._refill()
+            wait_time = 0.0
+            if self.tokens < 1:
+                wait_time = (1 - self.tokens) / self.rate_per_sec
+                await asyncio.sleep(wait_time)
+                self._refill()
+            self.tokens -= 1
+            return wait_time
@@ -3,39 +3,75 @@ core/redis_manager.py
 Redis Communication Bus for Agent Pub/Sub.
 """
 import redis.asyncio as redis
+import asyncio
 import json
 import os
 import logging
 from typing import Callable, Any
 from datetime import datetime
 
+# Compact binary bus payloads (falls back to JSON); REDIS_BUS_JSON=true forces readable JSON for debugging
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except ImportError:
+    msgpack = None
+    HAS_MSGPACK = False
+_SUBSCRIBE_BATCH = 64  # max messages drained per event-loop wakeup
+_HISTORY_MAX = int(os.getenv("REDIS_HISTORY_MAX", "1000"))  # newest entries kept per task
+_USE_MSGPACK = HAS_MSGPACK and os.getenv("REDIS_BUS_JSON", "false").lower() != "true"
+
+def _encode(message: dict) -> bytes:
+    if _USE_MSGPACK:
+        return msgpack.packb(message, use_bin_type=True)
+    return json.dumps(message).encode()
+
+def _decode(data: bytes) -> Any:
+    if HAS_MSGPACK:
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except Exception:
+            pass  # JSON payload (fallback mode, or history written before the switch)
+    return json.loads(data)
+
 class RedisMessageBus:
     def __init__(self):
         self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
         self.logger = logging.getLogger("redis_bus")
         try:
             self.redis = redis.from_url(self.redis_url, decode_responses=True)
+            # Bus payloads are binary, so they go through a client that leaves bytes alone
+            self._raw = redis.from_url(self.redis_url, decode_responses=False)
             self.logger.info(f"Connected to Redis at {self.redis_url}")
         except Exception as e:
             self.logger.error(f"Redis connection failed: {e}")
             self.redis = None
+            self._raw = None
 
     async def publish(self, channel: str, message: dict):
         if self.redis:
             try:
-                await self.redis.publish(channel, json.dumps(message))
+                await self._raw.publish(channel, _encode(message))
             except Exception as e:
                 self.logger.error(f"Failed to publish to {channel}: {e}")
 
     async def subscribe(self, channel: str, callback: Callable):
         if self.redis:
             try:
-                pubsub = self.redis.pubsub()
+                pubsub = self._raw.pubsub()
                 await pubsub.subscribe(channel)
-                async for message in pubsub.listen():
-                    if message["type"] == "message":
-                        data = json.loads(message["data"])
-                        await callback(data)
+                while True:
+                    # Block for the first message, then drain whatever is already buffered
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+                    batch = []
+                    while message is not None:
+                        if message["type"] == "message":
+                            batch.append(message["data"])
+                        if len(batch) >= _SUBSCRIBE_BATCH:
+                            break
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0)
+                    if batch:
+                        await asyncio.gather(*(callback(_decode(data)) for data in batch))
             except Exception as e:
                 self.logger.error(f"Subscription failed: {e}")
 
@@ -47,24 +83,62 @@ class RedisMessageBus:
             "details": details or {},
             "timestamp": datetime.now().isoformat()
         }
-        await self.publish(f"task:{task_id}", message)
-        await self.publish("global:tasks", message)
+        if not self.redis:
+            return
+        # Both channels in one round-trip, encoded once
+        payload = _encode(message)
+        try:
+            pipe = self._raw.pipeline(transaction=False)
+            pipe.publish(f"task:{task_id}", payload)
+            pipe.publish("global:tasks", payload)
+            await pipe.execute()
+        except Exception as e:
+            self.logger.error(f"Failed to publish status for {task_id}: {e}")
+
+    async def publish_and_store(self, task_id: str, agent_id: str, status: str, details: dict = None):
+        """publish_task_status + store_task_history in one pipelined round-trip, encoding once"""
+        if not self.redis:
+            return
+        message = {
+            "task_id": task_id,
+            "agent_id": agent_id,
+            "status": status,
+            "details": details or {},
+            "timestamp": datetime.now().isoformat()
+        }
+        payload = _encode(message)
+        key = f"history:{task_id}"
+        try:
+            pipe = self._raw.pipeline(transaction=False)
+            pipe.publish(f"task:{task_id}", payload)
+            pipe.publish("global:tasks", payload)
+            pipe.lpush(key, payload)
+            pipe.ltrim(key, 0, _HISTORY_MAX - 1)
+            pipe.expire(key, 86400)
+            await pipe.execute()
+        except Exception as e:
+            self.logger.error(f"Failed to publish/store status for {task_id}: {e}")
 
     async def store_task_history(self, task_id: str, message: dict):
         if self.redis:
             try:
                 key = f"history:{task_id}"
-                await self.redis.lpush(key, json.dumps(message))
-                await self.redis.expire(key, 86400)
+                # MULTI: push, cap and TTL applied together in one round-trip
+                pipe = self._raw.pipeline(transaction=True)
+                pipe.lpush(key, _encode(message))
+                pipe.ltrim(key, 0, _HISTORY_MAX - 1)
+                pipe.expire(key, 86400)
+                await pipe.execute()
             except Exception as e:
                 self.logger.error(f"Failed to store history: {e}")
 
-    async def get_task_history(self, task_id: str) -> list:
+    async def get_task_history(self, task_id: str, start: int = 0, stop: int = -1) -> list:
+        """Newest first; start/stop are LRANGE indexes (inclusive)"""
         if self.redis:
             try:
                 key = f"history:{task_id}"
-                history = await self.redis.lrange(key, 0, -1)
-                return [json.loads(h) for h in history]
+                history = await self._raw.lrange(key, start, stop)
+                return [_decode(h) for h in history]
             except Exception as e:
                 self.logger.error(f"Failed to get history: {e}")
         return []
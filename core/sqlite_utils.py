@@ -0,0 +1,34 @@
+"""
+core/sqlite_utils.py
+Connection tuning shared by the task database and the metrics collector.
+"""
+import sqlite3
+
+# Per-connection settings: these reset on every connect, unlike journal_mode=WAL which persists in the file
+_CONNECTION_PRAGMAS = """
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-65536;
+    PRAGMA busy_timeout=30000;
+    PRAGMA mmap_size=268435456;
+"""
+
+def is_file_db(db_path: str) -> bool:
+    return db_path != ":memory:" and not db_path.startswith("file::memory:") and "mode=memory" not in db_path
+
+def tune_connection(conn: sqlite3.Connection, db_path: str):
+    """WAL (readers don't block the writer, one fsync per checkpoint) plus cache/mmap sizing"""
+    if not is_file_db(db_path):
+        return
+    mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    if mode.lower() != "wal":
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_CONNECTION_PRAGMAS)
+
+def checkpoint_and_close(conn: sqlite3.Connection, db_path: str):
+    """Fold the WAL back into the main file so it doesn't linger on disk, then close"""
+    try:
+        if is_file_db(db_path):
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
@@ -4,6 +4,7 @@ from sqlalchemy import create_engine, Column, String, Integer, DateTime, Text, J
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+from typing import List, Dict, Any
 import logging
 import enum
 
@@ -29,7 +30,11 @@ class DatabaseManager:
         database_url = os.getenv("DATABASE_URL", "sqlite:///devorchestra.db")
         
         try:
-            self.engine = create_engine(database_url, echo=False)
+            engine_kwargs = {"pool_pre_ping": True, "future": True}
+            if not database_url.startswith("sqlite"):
+                # SQLite's default pools take no sizing arguments
+                engine_kwargs.update(pool_size=10, max_overflow=20)
+            self.engine = create_engine(database_url, echo=False, **engine_kwargs)
             Base.metadata.create_all(self.engine)
             self.Session = sessionmaker(bind=self.engine)
             self.logger.info(f"Database connected: {database_url}")
@@ -37,6 +42,18 @@ class DatabaseManager:
             self.logger.error(f"Database connection failed: {e}")
             raise
 
+    def bulk_add_tasks(self, rows: List[Dict[str, Any]]):
+        """Insert many tasks with one Core executemany (no ORM identity map); rows must share the same keys"""
+        if not rows:
+            return
+        with self.engine.begin() as conn:
+            conn.execute(Task.__table__.insert(), rows)
+
+    def add_task_core(self, task_id: str, user_story: str, status: TaskStatus = TaskStatus.PENDING):
+        """Single-task insert through Core, skipping Session/unit-of-work overhead"""
+        with self.engine.begin() as conn:
+            conn.execute(Task.__table__.insert(), {"id": task_id, "user_story": user_story, "status": status})
+
 _db_manager = None
 
 def get_db_manager() -> DatabaseManager:
@@ -6,6 +6,7 @@ import os
 import logging
 from datetime import datetime
 from enum import Enum
+from core.sqlite_utils import tune_connection, checkpoint_and_close
 
 logger = logging.getLogger(__name__)
 
@@ -19,9 +20,14 @@ class DatabaseManager:
     def __init__(self, db_path="devorchestra.db"):
         self.db_path = db_path
         self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        tune_connection(self.conn, db_path)
         self._create_tables()
         logger.info(f"✅ Database connected: {db_path}")
     
+    def close(self):
+        """Checkpoint the WAL and close (call on shutdown)"""
+        checkpoint_and_close(self.conn, self.db_path)
+    
     def _create_tables(self):
         """Create necessary tables"""
         self.conn.executescript("""
@@ -65,6 +71,20 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error updating task: {e}")
     
+    def upsert_task(self, task_id: str, user_story: str, status: TaskStatus, result: str = None):
+        """Create or update a task in one statement and one commit"""
+        try:
+            self.conn.execute(
+                """INSERT INTO tasks (id, user_story, status, result) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(id) DO UPDATE SET
+                       status = excluded.status,
+                       result = COALESCE(excluded.result, tasks.result)""",
+                (task_id, user_story, status.value, result)
+            )
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Error upserting task: {e}")
+    
     def get_task(self, task_id: str):
         """Get task by ID"""
         cursor = self.conn.execute(
@@ -80,6 +100,20 @@ class DatabaseManager:
         )
         return cursor.fetchone()
 
+    def get_performance_summary(self):
+        """(total, successful, avg_time_seconds) over the last 7 days"""
+        cursor = self.conn.execute("""
+            SELECT 
+                COUNT(*) as total_tasks,
+                SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as successful,
+                AVG(CASE WHEN status = 'completed' THEN 
+                    (julianday('now') - julianday(timestamp)) * 86400 
+                END) as avg_time_seconds
+            FROM tasks
+            WHERE timestamp > datetime('now', '-7 days')
+        """)
+        return cursor.fetchone()
+
 # Global instance
 _db_manager = None
 